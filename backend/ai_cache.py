@@ -0,0 +1,176 @@
+"""
+Persistent cache for AIService.parse_magic_prompt results
+Bot users repeat the same short phrases ("cafe 30k") every day, so answers are
+stored in SQLite keyed on the normalized text and provider.
+
+Answers that only depend on "now" (a transaction dated today, a budget for the
+current month, from text that names no date or month) are stored
+date-independently and re-resolved against the current date on every hit; an
+explicit time ("8h30") is kept. Anything else (e.g. "hôm qua", "15/1",
+"tháng 10") is only reused on the same day it was produced.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from datetime import datetime
+
+from .quick_parser import fold
+
+AI_CACHE_TTL_DAYS = float(os.getenv("AI_CACHE_TTL_DAYS", "30"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "5000"))
+
+# Run eviction after this many inserts
+EVICT_EVERY = 50
+
+# Scope for entries that are valid on any day
+ANY_DAY = '*'
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Explicit dates and months in (folded) text: "17/10", "10/2026", "2026-10-17", "tháng 10", "ngày 5"
+EXPLICIT_DATE_RE = re.compile(r'\d{1,2}/\d{1,2}|\d{4}-\d{1,2}|\b(?:thang|ngay) \d{1,2}\b')
+# Explicit times: "8h", "8h30", "8:30", "8 giờ"
+EXPLICIT_TIME_RE = re.compile(r'\b\d{1,2}(?:h\d{0,2}|:\d{2}| ?gio)\b')
+
+
+def normalize_text(text):
+    """Case-, whitespace- and Unicode-form-insensitive version of a prompt"""
+    text = unicodedata.normalize('NFC', text or '')
+    return _WHITESPACE.sub(' ', text).strip().lower()
+
+
+class PromptCache:
+    def __init__(self, storage, ttl_days=AI_CACHE_TTL_DAYS, max_entries=AI_CACHE_MAX_ENTRIES):
+        self.storage = storage
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(text, provider, scope):
+        # v2: entries from before explicit dates were excluded from ANY_DAY are ignored
+        raw = f"v2\x00{provider}\x00{scope}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, text, provider, now=None):
+        """Cached result for text, resolved against `now`, or None on a miss"""
+        now = now or datetime.now()
+        min_created = time.time() - self.ttl
+        try:
+            for scope in (now.strftime("%Y-%m-%d"), ANY_DAY):
+                response = self.storage.get_ai_cache_entry(self._key(text, provider, scope), min_created, time.time())
+                if response is not None:
+                    with self._lock:
+                        self.hits += 1
+                    return self._resolve(json.loads(response), now)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"AI cache lookup failed: {type(e).__name__}: {e}")
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, provider, result, now=None):
+        """Store a successful parse result"""
+        if not isinstance(result, dict) or 'error' in result:
+            return
+        now = now or datetime.now()
+        scope, stored = self._generalize(text, result, now)
+        try:
+            self.storage.put_ai_cache_entry(
+                self._key(text, provider, scope),
+                json.dumps(stored, ensure_ascii=False),
+                time.time()
+            )
+            with self._lock:
+                self._puts += 1
+                evict = self._puts % EVICT_EVERY == 0
+            if evict:
+                self.evict()
+        except sqlite3.Error as e:
+            print(f"AI cache store failed: {type(e).__name__}: {e}")
+
+    def evict(self):
+        removed = self.storage.evict_ai_cache(time.time() - self.ttl, self.max_entries)
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'evictions': evictions,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'entries': self.storage.count_ai_cache_entries(),
+            'max_entries': self.max_entries,
+            'ttl_days': self.ttl / 86400
+        }
+
+    @staticmethod
+    def _generalize(text, result, now):
+        """
+        Decide whether result depends on the current date.
+        Returns (scope, stored_result); "today"/"current month" values are
+        replaced by markers that _resolve() fills in again on a hit. Text that
+        names a date or month is never generalized: "17/10" stays 17/10.
+        """
+        stored = dict(result)
+        today = now.strftime("%Y-%m-%d")
+        intent = result.get('intent')
+        folded = fold(text or '')
+        if EXPLICIT_DATE_RE.search(folded):
+            return today, stored
+
+        if intent == 'transaction':
+            date = result.get('date')
+            if not date:
+                return ANY_DAY, stored
+            date = str(date)
+            if date[:10] == today:
+                stored['date'] = None
+                if EXPLICIT_TIME_RE.search(folded) and len(date) >= 16:
+                    # "cafe 30k lúc 8h30": today, at the time the model read from the text
+                    stored['_date'] = 'today'
+                    stored['_time'] = date[11:16]
+                else:
+                    stored['_date'] = 'now'
+                return ANY_DAY, stored
+            return today, stored
+
+        if intent == 'budget':
+            month = result.get('month')
+            if not month:
+                return ANY_DAY, stored
+            if month == now.strftime("%Y-%m"):
+                stored['month'] = None
+                stored['_month'] = 'current'
+                return ANY_DAY, stored
+            return today, stored
+
+        return today, stored
+
+    @staticmethod
+    def _resolve(stored, now):
+        result = dict(stored)
+        marker = result.pop('_date', None)
+        stored_time = result.pop('_time', None)
+        if marker == 'now':
+            result['date'] = now.strftime("%Y-%m-%dT%H:%M")
+        elif marker == 'today':
+            result['date'] = f"{now.strftime('%Y-%m-%d')}T{stored_time}"
+        if result.pop('_month', None) == 'current':
+            result['month'] = now.strftime("%Y-%m")
+        return result
@@ -0,0 +1,245 @@
+"""
+Routing across AI providers (OpenAI, Gemini)
+AIRouter.call() tries providers in order of observed health: the preferred one
+(/api/switch-model) first unless its recent latency/error numbers are clearly
+worse. A failed call fails over to the next provider. With hedging enabled,
+the next provider is also started when the first has not answered within its
+p95 latency, and whichever answers first wins. AIRouter.stream() does the same
+for streamed replies, failing over only until the first piece has been yielded.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+AI_ROUTER_TIMEOUT = float(os.getenv("AI_ROUTER_TIMEOUT", "45"))  # seconds for the whole call
+AI_HEDGE = os.getenv("AI_HEDGE", "0") == "1"
+AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "3"))  # seconds, until p95 is known
+
+# Samples needed before p95/error rate are trusted
+MIN_SAMPLES = 10
+# Assumed latency for a provider without enough samples
+DEFAULT_LATENCY = 2.0
+# Never hedge sooner than this
+MIN_HEDGE_DELAY = 0.5
+# The preferred provider keeps first place until it is this many times worse
+PREFERENCE_FACTOR = 2.0
+# Consecutive failures that take a provider out of rotation, and for how long
+CIRCUIT_FAILURES = 3
+CIRCUIT_COOLDOWN = 30.0
+
+
+class AIRouterError(Exception):
+    pass
+
+
+class ProviderStats:
+    """Rolling latency/error window for one provider"""
+
+    def __init__(self, window=100):
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=window)  # successful calls only
+        self.outcomes = deque(maxlen=window)   # True = success
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_failure = None
+        self.last_error = None
+
+    def record(self, latency, error=None):
+        with self._lock:
+            self.calls += 1
+            self.outcomes.append(error is None)
+            if error is None:
+                self.latencies.append(latency)
+                self.consecutive_failures = 0
+            else:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_failure = time.monotonic()
+                self.last_error = str(error)
+
+    def p95(self):
+        with self._lock:
+            if len(self.latencies) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def error_rate(self):
+        with self._lock:
+            if len(self.outcomes) < MIN_SAMPLES:
+                return 0.0
+            return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def circuit_open(self):
+        with self._lock:
+            return (self.consecutive_failures >= CIRCUIT_FAILURES
+                    and time.monotonic() - self.last_failure < CIRCUIT_COOLDOWN)
+
+    def score(self):
+        """Lower is better: expected latency inflated by the error rate"""
+        if self.circuit_open():
+            return float('inf')
+        p95 = self.p95()
+        return (p95 if p95 is not None else DEFAULT_LATENCY) * (1 + 4 * self.error_rate())
+
+    def snapshot(self):
+        p95 = self.p95()
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'error_rate': round(self.error_rate(), 3),
+            'p95_ms': round(p95 * 1000) if p95 is not None else None,
+            'circuit_open': self.circuit_open(),
+            'last_error': self.last_error,
+        }
+
+
+class AIRouter:
+    def __init__(self, providers, preferred, timeout=AI_ROUTER_TIMEOUT, hedge=AI_HEDGE,
+                 hedge_delay=AI_HEDGE_DELAY, max_workers=8, stream_providers=None):
+        """
+        providers: {name: callable(*args) -> result}, raising on failure
+        preferred: callable returning the preferred provider name
+        stream_providers: {name: callable(*args) -> generator of reply pieces}, for stream()
+        """
+        self.providers = providers
+        self.stream_providers = stream_providers or {}
+        self.preferred = preferred
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.stats = {name: ProviderStats() for name in providers}
+        self.counters = {'calls': 0, 'failovers': 0, 'hedges': 0, 'hedge_wins': 0, 'timeouts': 0}
+        self._counter_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-router")
+
+    def _count(self, key):
+        with self._counter_lock:
+            self.counters[key] += 1
+
+    def ranked(self):
+        """Provider names, best first"""
+        preferred = self.preferred()
+
+        def score(name):
+            value = self.stats[name].score()
+            return value / PREFERENCE_FACTOR if name == preferred else value
+
+        return sorted(self.providers, key=lambda name: (score(name), name != preferred))
+
+    def _hedge_after(self, name):
+        p95 = self.stats[name].p95()
+        return max(MIN_HEDGE_DELAY, p95 if p95 is not None else self.hedge_delay)
+
+    def _timed(self, name, args):
+        start = time.monotonic()
+        try:
+            result = self.providers[name](*args)
+        except Exception as e:
+            self.stats[name].record(time.monotonic() - start, error=e)
+            raise
+        self.stats[name].record(time.monotonic() - start)
+        return result
+
+    def call(self, *args):
+        """(provider name, result) from the first provider to succeed; raises AIRouterError"""
+        order = self.ranked()
+        if not order:
+            raise AIRouterError("No AI provider configured")
+        self._count('calls')
+
+        deadline = time.monotonic() + self.timeout
+        pending = {}
+        errors = {}
+        launched = []
+
+        def launch():
+            name = order[len(launched)]
+            launched.append(name)
+            pending[self._executor.submit(self._timed, name, args)] = name
+
+        launch()
+        hedge_at = time.monotonic() + self._hedge_after(order[0]) if self.hedge else None
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            can_hedge = hedge_at is not None and len(launched) < len(order)
+            until = min(deadline, hedge_at) if can_hedge else deadline
+            done, _ = wait(pending, timeout=max(0, until - now), return_when=FIRST_COMPLETED)
+
+            if not done:
+                if can_hedge and time.monotonic() >= hedge_at:
+                    self._count('hedges')
+                    launch()
+                    hedge_at = None
+                continue
+
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors[name] = e
+                    continue
+                if name != order[0]:
+                    self._count('failovers' if order[0] in errors else 'hedge_wins')
+                return name, result
+
+            if not pending and len(launched) < len(order):
+                launch()
+
+        if pending:
+            # Slow calls keep running in the background and still update the stats
+            self._count('timeouts')
+            raise AIRouterError(f"AI request timed out after {self.timeout:g}s")
+        raise AIRouterError("; ".join(f"{name}: {error}" for name, error in errors.items()))
+
+    def stream(self, *args):
+        """
+        Yield the reply pieces of the first streaming provider to succeed, in
+        ranked order. A provider that fails before its first piece fails over to
+        the next one; once pieces have been yielded an error is re-raised, since
+        the caller has already consumed part of that reply. Not hedged: the
+        first provider to produce output owns the stream.
+        """
+        order = [name for name in self.ranked() if name in self.stream_providers]
+        if not order:
+            raise AIRouterError("No streaming AI provider configured")
+        self._count('calls')
+
+        errors = {}
+        for name in order:
+            start = time.monotonic()
+            started = False
+            try:
+                with closing(self.stream_providers[name](*args)) as pieces:
+                    for piece in pieces:
+                        started = True
+                        yield piece
+            except Exception as e:
+                self.stats[name].record(time.monotonic() - start, error=e)
+                if started:
+                    raise
+                errors[name] = e
+                continue
+            self.stats[name].record(time.monotonic() - start)
+            if name != order[0]:
+                self._count('failovers')
+            return
+        raise AIRouterError("; ".join(f"{name}: {error}" for name, error in errors.items()))
+
+    def get_stats(self):
+        return {
+            'preferred': self.preferred(),
+            'order': self.ranked(),
+            'hedge': self.hedge,
+            'counters': dict(self.counters),
+            'providers': {name: stats.snapshot() for name, stats in self.stats.items()},
+        }
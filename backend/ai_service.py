@@ -1,22 +1,58 @@
 import google.generativeai as genai
-from openai import OpenAI
+from openai import OpenAI, DefaultHttpxClient
+import httpx
 import os
 import json
 import datetime
+import threading
 from dotenv import load_dotenv
+from .quick_parser import quick_parse, DEFAULT_MIN_CONFIDENCE
+from . import bulk_extract
+from .ai_router import AIRouter
 
 load_dotenv()
 
+# HTTP settings shared by every AI call in the process
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "30"))  # seconds
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "20"))
+
+# Local parse results at or above this confidence skip the LLM (set above 1 to disable)
+QUICK_PARSE_MIN_CONFIDENCE = float(os.getenv("QUICK_PARSE_MIN_CONFIDENCE", str(DEFAULT_MIN_CONFIDENCE)))
+
+BULK_SYSTEM_PROMPT = "You are a specialized financial data extractor. Always return valid JSON."
+
 class AIService:
     # State management for active provider
     _active_provider = "openai" # default
 
-    def __init__(self):
+    # Process-wide instance, see instance()
+    _instance = None
+    _instance_pid = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, timeout=AI_REQUEST_TIMEOUT, max_retries=AI_MAX_RETRIES, cache=None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # Optional ai_cache.PromptCache for parse_magic_prompt
+        self.cache = cache
+
         # OpenAI Setup
         self.openai_key = os.getenv("OPENAI_API_KEY")
         self.openai_client = None
         if self.openai_key:
-            self.openai_client = OpenAI(api_key=self.openai_key)
+            # One pooled HTTP client keeps connections and TLS sessions alive between calls
+            self.openai_client = OpenAI(
+                api_key=self.openai_key,
+                timeout=timeout,
+                max_retries=max_retries,
+                http_client=DefaultHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=AI_MAX_CONNECTIONS,
+                        max_keepalive_connections=AI_MAX_CONNECTIONS
+                    )
+                )
+            )
         
         # Gemini Setup
         self.gemini_key = os.getenv("GEMINI_API_KEY")
@@ -25,6 +61,33 @@ class AIService:
             genai.configure(api_key=self.gemini_key)
             self.gemini_model = genai.GenerativeModel('gemini-2.0-flash')
 
+        # Only configured providers take part in routing; invalid JSON counts as a failure
+        providers = {}
+        stream_providers = {}
+        if self.openai_client:
+            providers["openai"] = self._call_openai
+            stream_providers["openai"] = self._stream_openai
+        if self.gemini_model:
+            providers["gemini"] = self._call_gemini
+            stream_providers["gemini"] = self._stream_gemini
+        self.router = AIRouter(providers, preferred=self.get_active_provider, max_workers=AI_MAX_CONNECTIONS,
+                               stream_providers=stream_providers)
+
+    @classmethod
+    def instance(cls):
+        """
+        Shared AIService for this process, created on first use.
+        The OpenAI/Gemini clients are thread-safe, so concurrent requests can
+        share it. A forked worker gets its own instance (sockets aren't fork-safe).
+        """
+        pid = os.getpid()
+        if cls._instance is None or cls._instance_pid != pid:
+            with cls._instance_lock:
+                if cls._instance is None or cls._instance_pid != pid:
+                    cls._instance = cls()
+                    cls._instance_pid = pid
+        return cls._instance
+
     @classmethod
     def set_provider(cls, provider):
         if provider.lower() in ["openai", "gemini"]:
@@ -43,7 +106,81 @@ class AIService:
         else:
             return {"provider": "Gemini", "model": "gemini-2.0-flash"}
 
+    def _stream_text(self, prompt, system_prompt):
+        """Yield a JSON reply piece by piece as tokens arrive, through the router (stats, failover)"""
+        yield from self.router.stream(prompt, system_prompt)
+
+    def _stream_openai(self, prompt, system_prompt):
+        stream = self.openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            stream=True
+        )
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+
+    def _stream_gemini(self, prompt, system_prompt):
+        response = self.gemini_model.generate_content(
+            prompt,
+            stream=True,
+            request_options={"timeout": self.timeout}
+        )
+        for chunk in response:
+            yield chunk.text
+
+    def _complete_json(self, prompt, system_prompt):
+        """Send prompt through the router (preferred provider, failover/hedging) and parse its JSON reply"""
+        try:
+            _, result = self.router.call(prompt, system_prompt)
+            return result
+        except Exception as e:
+            return {"error": str(e)}
+
+    def _call_openai(self, prompt, system_prompt):
+        response = self.openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"}
+        )
+        return json.loads(response.choices[0].message.content.strip())
+
+    def _call_gemini(self, prompt, system_prompt):
+        response = self.gemini_model.generate_content(
+            prompt,
+            request_options={"timeout": self.timeout}
+        )
+        return json.loads(response.text.replace('```json', '').replace('```', '').strip())
+
     def parse_magic_prompt(self, text):
+        # Common phrases ("cafe 30k", "lương 20tr") are handled locally, no network call
+        local_result, confidence = quick_parse(text)
+        if local_result is not None and confidence >= QUICK_PARSE_MIN_CONFIDENCE:
+            return local_result
+
+        provider = self.get_active_provider()
+        if self.cache:
+            cached = self.cache.get(text, provider)
+            if cached is not None:
+                return cached
+
+        result = self._parse_magic_prompt(text)
+
+        if self.cache:
+            self.cache.put(text, provider, result)
+        return result
+
+    def _parse_magic_prompt(self, text):
         current_time = datetime.datetime.now().isoformat()
         current_month = datetime.datetime.now().strftime("%Y-%m")
         
@@ -119,27 +256,7 @@ class AIService:
         - If the text is neither, return {{ "error": "Could not understand your request" }}
         """
         
-        provider = self.get_active_provider()
-        try:
-            if provider == "openai":
-                if not self.openai_client: return {"error": "OpenAI not configured"}
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": "You are a specialized financial assistant. Always return valid JSON."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                content = response.choices[0].message.content.strip()
-            else:
-                if not self.gemini_model: return {"error": "Gemini not configured"}
-                response = self.gemini_model.generate_content(prompt)
-                content = response.text.replace('```json', '').replace('```', '').strip()
-            
-            return json.loads(content)
-        except Exception as e:
-            return {"error": str(e)}
+        return self._complete_json(prompt, "You are a specialized financial assistant. Always return valid JSON.")
 
     def parse_transaction(self, text):
         # Backward compatibility
@@ -149,6 +266,28 @@ class AIService:
         return result
 
     def extract_bulk_transactions(self, text):
+        """Extract every transaction; long pastes are split by date and extracted in parallel"""
+        chunks = bulk_extract.split_text(text)
+        if len(chunks) == 1:
+            return self._extract_bulk_chunk(text)
+        return bulk_extract.extract_all(self._extract_bulk_chunk, chunks)
+
+    def stream_bulk_transactions(self, text):
+        """
+        Yields bulk_extract.iter_extract_stream events: each transaction as soon as
+        it parses out of the provider's streamed reply, plus one event per finished chunk
+        """
+        return bulk_extract.iter_extract_stream(self._stream_bulk_chunk, bulk_extract.split_text(text))
+
+    def _extract_bulk_chunk(self, text):
+        return self._complete_json(self._bulk_prompt(text), BULK_SYSTEM_PROMPT)
+
+    def _stream_bulk_chunk(self, text):
+        parser = bulk_extract.JSONArrayStreamParser('transactions')
+        for piece in self._stream_text(self._bulk_prompt(text), BULK_SYSTEM_PROMPT):
+            yield from parser.feed(piece)
+
+    def _bulk_prompt(self, text):
         current_time = datetime.datetime.now().isoformat()
         current_month = datetime.datetime.now().strftime("%Y-%m")
         
@@ -192,27 +331,6 @@ class AIService:
             {{"amount": 200000, "category": "Other Income", "type": "income", "description": "Chiều được trả nợ", "date": "2025-01-12", "original_snippet": "Chiều được trả nợ 200k"}}
         ]}}
         """
-
-        provider = self.get_active_provider()
-        try:
-            if provider == "openai":
-                if not self.openai_client: return {"error": "OpenAI not configured"}
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": "You are a specialized financial data extractor. Always return valid JSON."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                content = response.choices[0].message.content.strip()
-            else:
-                if not self.gemini_model: return {"error": "Gemini not configured"}
-                response = self.gemini_model.generate_content(prompt)
-                content = response.text.replace('```json', '').replace('```', '').strip()
-            
-            return json.loads(content)
-        except Exception as e:
-            return {"error": str(e)}
+        return prompt
 
 
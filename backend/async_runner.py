@@ -0,0 +1,90 @@
+"""
+Run blocking calls (SQLite, synchronous AI/HTTP clients) off the asyncio event loop
+Each BlockingRunner owns a bounded thread pool plus a cap on in-flight calls, and
+applies a per-call timeout so one slow request cannot stall every other chat
+(writes are awaited to completion instead, see run_to_completion).
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BlockingRunner:
+    def __init__(self, name, max_workers, timeout, max_pending=None):
+        """
+        max_workers: threads running calls concurrently
+        timeout: default seconds to wait for a call (None = no limit)
+        max_pending: calls allowed in flight (running + queued) before callers wait
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_pending = max_pending or max_workers * 4
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self):
+        # asyncio primitives are bound to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        """
+        Await func(*args, **kwargs) on the pool.
+        Raises asyncio.TimeoutError if the call runs longer than `timeout` (or the
+        runner default); time spent queued for a thread doesn't count. The worker
+        thread itself cannot be interrupted: it finishes in the background and
+        keeps its max_pending slot until then. Only use this for calls that are
+        safe to give up on (reads, AI requests); see run_to_completion().
+        """
+        return await self._run(functools.partial(func, *args, **kwargs),
+                               timeout if timeout is not None else self.timeout)
+
+    async def run_to_completion(self, func, *args, **kwargs):
+        """
+        Await func(*args, **kwargs) on the pool with no timeout, for writes: a
+        timed-out write would still commit, and the user's retry would record it
+        twice. SQLite's busy_timeout still bounds how long a write waits for a lock.
+        """
+        return await self._run(functools.partial(func, *args, **kwargs), None)
+
+    async def _run(self, call, timeout):
+        loop = asyncio.get_running_loop()
+        semaphore = self._get_semaphore()
+        await semaphore.acquire()
+        started = loop.create_future()
+
+        def mark_started():
+            if not started.done():
+                started.set_result(None)
+
+        def work():
+            loop.call_soon_threadsafe(mark_started)
+            return call()
+
+        try:
+            future = self._executor.submit(work)
+        except BaseException:
+            semaphore.release()
+            raise
+        # The slot is freed when the thread finishes, not when we stop waiting
+        def release(_):
+            try:
+                loop.call_soon_threadsafe(semaphore.release)
+            except RuntimeError:
+                pass  # loop already closed
+
+        future.add_done_callback(release)
+        result = asyncio.wrap_future(future, loop=loop)
+        if timeout is None:
+            return await result
+        await asyncio.wait({started, result}, return_when=asyncio.FIRST_COMPLETED)
+        return await asyncio.wait_for(asyncio.shield(result), timeout)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,123 @@
+"""
+Database backups for Money Tracker
+Snapshots are taken with the SQLite online backup API (see Storage.backup),
+so they are consistent even while the web app or the bot is writing.
+"""
+
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+# Size of each read when streaming a snapshot to a client
+STREAM_CHUNK_SIZE = 64 * 1024
+
+SNAPSHOT_PREFIX = 'money_tracker-'
+SNAPSHOT_SUFFIX = '.db'
+
+
+def snapshot_to_tempfile(storage):
+    """Write a snapshot to a new temp file and return its path (caller deletes it)"""
+    fd, path = tempfile.mkstemp(prefix=SNAPSHOT_PREFIX, suffix=SNAPSHOT_SUFFIX)
+    os.close(fd)
+    try:
+        storage.backup(path)
+    except Exception:
+        os.unlink(path)
+        raise
+    return path
+
+
+def iter_file(path, chunk_size=STREAM_CHUNK_SIZE, delete=True):
+    """Yield a file in chunks, removing it afterwards (even if the client disconnects)"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if delete:
+            discard(path)
+
+
+def discard(path):
+    """Remove a temp snapshot if it is still there"""
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def list_snapshots(backup_dir):
+    """Snapshot files in backup_dir, oldest first"""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = sorted(
+        name for name in os.listdir(backup_dir)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)
+    )
+    return [os.path.join(backup_dir, name) for name in names]
+
+
+def create_rotated_snapshot(storage, backup_dir, keep):
+    """Write a timestamped snapshot into backup_dir and delete all but the newest `keep`"""
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    final_path = os.path.join(backup_dir, f"{SNAPSHOT_PREFIX}{stamp}{SNAPSHOT_SUFFIX}")
+    # Back up to a temp name first so a crash never leaves a half-written snapshot
+    tmp_path = final_path + '.partial'
+    storage.backup(tmp_path)
+    os.replace(tmp_path, final_path)
+
+    snapshots = list_snapshots(backup_dir)
+    for old in snapshots[:max(0, len(snapshots) - keep)]:
+        try:
+            os.unlink(old)
+        except OSError as e:
+            print(f"Could not remove old backup {old}: {e}")
+    return final_path
+
+
+class BackupScheduler(threading.Thread):
+    """Background thread that takes a rotated snapshot every `interval` seconds"""
+
+    def __init__(self, storage, backup_dir, interval, keep=7):
+        super().__init__(name='backup-scheduler', daemon=True)
+        self.storage = storage
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                path = create_rotated_snapshot(self.storage, self.backup_dir, self.keep)
+                print(f"Backup written to {path}")
+            except Exception as e:
+                print(f"Scheduled backup failed: {type(e).__name__}: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_scheduled_backups(storage, default_dir):
+    """
+    Start a BackupScheduler if MONEY_TRACKER_BACKUP_INTERVAL_HOURS is set.
+    MONEY_TRACKER_BACKUP_KEEP (default 7) and MONEY_TRACKER_BACKUP_DIR
+    (default: default_dir) control rotation and location.
+    Returns the scheduler, or None when scheduled backups are disabled.
+    """
+    hours = os.getenv('MONEY_TRACKER_BACKUP_INTERVAL_HOURS')
+    if not hours:
+        return None
+    scheduler = BackupScheduler(
+        storage,
+        backup_dir=os.getenv('MONEY_TRACKER_BACKUP_DIR', default_dir),
+        interval=float(hours) * 3600,
+        keep=int(os.getenv('MONEY_TRACKER_BACKUP_KEEP', '7'))
+    )
+    scheduler.start()
+    return scheduler
@@ -0,0 +1,155 @@
+"""
+Offline load test for the Telegram bot
+Feeds fake text updates from many chats through the real handlers, with the
+Telegram HTTP API replaced by a local stub and a throwaway database.
+
+Usage: python -m money_tracker.backend.bot_loadtest --chats 50 --messages 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from telegram import Update
+from telegram.ext import TypeHandler
+from telegram.request import BaseRequest
+
+from . import telegram_bot
+
+FAKE_TOKEN = "123456:FAKE-TOKEN"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "MoneyTracker", "username": "fake_bot"}
+
+SAMPLE_MESSAGES = ["cafe 30k", "ăn sáng 50k", "grab đi làm 50k", "lương 20tr", "mua sách 200k"]
+
+
+class FakeTelegramRequest(BaseRequest):
+    """Answers Bot API calls locally with minimal successful responses"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+
+        if endpoint == 'getMe':
+            result = BOT_USER
+        elif endpoint == 'sendMessage':
+            self._message_id += 1
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(params.get('chat_id', 0)), "type": "private"},
+                "text": params.get('text', ''),
+                "from": BOT_USER,
+            }
+        else:
+            # sendChatAction, setMyCommands, ... all return True
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode('utf-8')
+
+
+def make_text_update(bot, update_id, chat_id, text):
+    """Build a private-chat text message Update as Telegram would send it"""
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"},
+            "text": text,
+        },
+    }, bot)
+
+
+def iter_fake_updates(bot, chats, messages_per_chat, texts=SAMPLE_MESSAGES):
+    """Interleaved updates from `chats` users, `messages_per_chat` each"""
+    update_id = 0
+    for i in range(messages_per_chat):
+        for chat_id in range(1, chats + 1):
+            update_id += 1
+            yield make_text_update(bot, update_id, chat_id, texts[(chat_id + i) % len(texts)])
+
+
+async def run_load_test(chats=20, messages_per_chat=5, concurrent_updates=None, api_latency=0.05, db_path=None):
+    """Process the fake updates and return throughput numbers"""
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='bot-loadtest-'), 'loadtest.db')
+    # Never open or write the real database
+    telegram_bot.init_services(db_path)
+
+    request = FakeTelegramRequest(latency=api_latency)
+    application = telegram_bot.build_application(
+        FAKE_TOKEN,
+        concurrent_updates=concurrent_updates,
+        request=request,
+        get_updates_request=FakeTelegramRequest()
+    )
+
+    total = chats * messages_per_chat
+    processed = 0
+    done = asyncio.Event()
+
+    async def count(update, context):
+        nonlocal processed
+        processed += 1
+        if processed >= total:
+            done.set()
+
+    # Runs after the real handlers (higher group) for every update
+    application.add_handler(TypeHandler(Update, count), group=99)
+
+    async with application:
+        await application.start()
+        started = time.perf_counter()
+        for update in iter_fake_updates(application.bot, chats, messages_per_chat):
+            await application.update_queue.put(update)
+        await done.wait()
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    return {
+        'updates': total,
+        'chats': chats,
+        'seconds': round(elapsed, 3),
+        'updates_per_second': round(total / elapsed, 1) if elapsed else None,
+        'api_calls': request.calls,
+        'transactions_this_month': telegram_bot.manager.get_aggregates(datetime.now().strftime("%Y-%m"))['count'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--chats', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=5, help='messages per chat')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='concurrent updates (default: BOT_CONCURRENT_UPDATES; 1 = sequential)')
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated Telegram API latency (s)')
+    args = parser.parse_args()
+    result = asyncio.run(run_load_test(args.chats, args.messages, args.concurrency, args.latency))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Chunked bulk extraction for long diary pastes
+The text is split on date headers ("12/1:", "1/2/2025 -", "Ngày 3/4:") into
+chunks of at most BULK_CHUNK_CHARS characters. The chunks are extracted
+concurrently (BULK_EXTRACT_WORKERS at a time) and the results are merged in
+input order, dropping transactions another chunk already produced.
+"""
+
+import json
+import os
+import queue
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+BULK_CHUNK_CHARS = int(os.getenv("BULK_CHUNK_CHARS", "3000"))
+BULK_EXTRACT_WORKERS = int(os.getenv("BULK_EXTRACT_WORKERS", "4"))
+
+# A date at the start of a line, followed by ":", "-", "." or ")"
+DATE_HEADER_RE = re.compile(
+    r'^[ \t]*(?:[-*•][ \t]*)?(?:ngày[ \t]+)?(\d{1,2}/\d{1,2}(?:/\d{2,4})?)[ \t]*[:.)\-]',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+def split_sections(text):
+    """Split text into (date_header, section) pairs; text before the first header has header None"""
+    matches = list(DATE_HEADER_RE.finditer(text))
+    if not matches:
+        return [(None, text)]
+    sections = []
+    if text[:matches[0].start()].strip():
+        sections.append((None, text[:matches[0].start()]))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections.append((match.group(1), text[match.start():end]))
+    return sections
+
+
+def _split_long(header, section, max_chars):
+    """Split one oversized section on line breaks, keeping its date on every piece"""
+    prefix = f"{header}:\n" if header else ""
+    pieces = []
+    current = ""
+    for line in section.splitlines(keepends=True):
+        if current and len(current) + len(line) > max_chars:
+            pieces.append(current)
+            current = prefix
+        current += line
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def split_text(text, max_chars=BULK_CHUNK_CHARS):
+    """Pack date sections into chunks of at most max_chars (a longer single line stays whole)"""
+    chunks = []
+    current = ""
+    for header, section in split_sections(text):
+        if len(section) > max_chars:
+            if current.strip():
+                chunks.append(current)
+            current = ""
+            chunks.extend(_split_long(header, section, max_chars))
+            continue
+        if current and len(current) + len(section) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += section
+    if current.strip():
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks] or [text]
+
+
+def dedupe_key(transaction):
+    """Same date, amount and source snippet (or description) = same transaction"""
+    snippet = transaction.get('original_snippet') or transaction.get('description') or ''
+    return (
+        transaction.get('date'),
+        transaction.get('amount'),
+        ' '.join(str(snippet).lower().split()),
+    )
+
+
+def iter_extract(extract_chunk, chunks, max_workers=BULK_EXTRACT_WORKERS):
+    """
+    Run extract_chunk(chunk_text) -> {"transactions": [...]} over chunks concurrently.
+    Yields one event per finished chunk, in completion order:
+    {"chunk": index, "chunks": total, "transactions": [new ones], "error": message or None}
+    A transaction is dropped if a different chunk already produced the same
+    dedupe_key; repeats inside one chunk are kept (two coffees on one day).
+    """
+    seen = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks))),
+                            thread_name_prefix="bulk-extract") as executor:
+        futures = {executor.submit(extract_chunk, chunk): index for index, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": str(e)}
+            fresh = []
+            for transaction in result.get('transactions') or []:
+                if seen.setdefault(dedupe_key(transaction), index) == index:
+                    fresh.append(transaction)
+            yield {
+                "chunk": index,
+                "chunks": len(chunks),
+                "transactions": fresh,
+                "error": result.get('error'),
+            }
+
+
+def extract_all(extract_chunk, chunks, max_workers=BULK_EXTRACT_WORKERS):
+    """Merged result in input order; {"error": ...} only if every chunk failed"""
+    by_chunk = {}
+    errors = {}
+    for event in iter_extract(extract_chunk, chunks, max_workers):
+        by_chunk[event['chunk']] = event['transactions']
+        if event['error']:
+            errors[event['chunk']] = event['error']
+    if len(errors) == len(chunks):
+        return {"error": errors[min(errors)]}
+    result = {"transactions": [t for index in sorted(by_chunk) for t in by_chunk[index]]}
+    if errors:
+        result["failed_chunks"] = sorted(errors)
+    return result
+
+
+class JSONArrayStreamParser:
+    """
+    Pull the objects of one JSON array out of a streamed reply as they complete.
+    feed('{"transactions": [{"amount": 5') -> []; feed('0000}, {') -> [{"amount": 50000}]
+    Text before the key (e.g. a ```json fence) and objects that fail to parse are skipped.
+    """
+
+    def __init__(self, key='transactions'):
+        self._key_re = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._buffer = ''
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._start = None
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        """Add the next piece of the reply; returns the objects completed by it"""
+        if self._done:
+            return []
+        self._buffer += text
+        if not self._in_array:
+            match = self._key_re.search(self._buffer)
+            if not match:
+                return []
+            self._in_array = True
+            self._pos = match.end()
+
+        objects = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == '}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads(buffer[self._start:i + 1]))
+                    except ValueError:
+                        pass
+                    self._start = None
+            elif ch == ']' and self._depth == 0:
+                self._done = True
+                break
+            i += 1
+
+        # Only the object still being built needs to stay in memory
+        keep = self._start if self._start is not None else i
+        self._buffer = buffer[keep:]
+        self._pos = i - keep
+        if self._start is not None:
+            self._start = 0
+        return objects
+
+
+def iter_extract_stream(stream_chunk, chunks, max_workers=BULK_EXTRACT_WORKERS):
+    """
+    Streaming iter_extract: stream_chunk(chunk_text) yields transactions one by one.
+    Yields events as soon as they happen, across all chunks:
+    {"event": "transaction", "chunk": index, "transaction": {...}} (deduped as in iter_extract)
+    {"event": "chunk", "chunk": index, "chunks": total, "error": message or None}
+    Closing the generator early cancels chunks that have not started yet.
+    """
+    events = queue.Queue()
+
+    def work(index, chunk):
+        try:
+            for transaction in stream_chunk(chunk):
+                events.put(('transaction', index, transaction))
+            events.put(('chunk', index, None))
+        except Exception as e:
+            events.put(('chunk', index, str(e)))
+
+    seen = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks))),
+                                  thread_name_prefix="bulk-stream")
+    try:
+        for index, chunk in enumerate(chunks):
+            executor.submit(work, index, chunk)
+        remaining = len(chunks)
+        while remaining:
+            kind, index, payload = events.get()
+            if kind == 'transaction':
+                if seen.setdefault(dedupe_key(payload), index) == index:
+                    yield {"event": "transaction", "chunk": index, "transaction": payload}
+            else:
+                remaining -= 1
+                yield {"event": "chunk", "chunk": index, "chunks": len(chunks), "error": payload}
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,73 @@
+"""
+Cross-process change notifications through SQLite, no broker needed
+Every write appends a change_log row in its own transaction (Storage._log_change).
+ChangeFeed watches PRAGMA data_version on a dedicated connection; the value
+moves whenever any other connection commits (another thread, gunicorn worker
+or the Telegram bot). It then reads the new change_log rows and passes them
+to a callback, which invalidates caches and pushes Socket.IO events.
+"""
+
+import os
+import threading
+
+CHANGE_POLL_MS = float(os.getenv('MONEY_TRACKER_CHANGE_POLL_MS', '100'))  # 0 = disabled
+
+
+class ChangeFeed:
+    def __init__(self, storage, on_changes, interval=CHANGE_POLL_MS / 1000):
+        """
+        on_changes(changes, complete): changes are change_log dicts, oldest first;
+        complete is False when older entries were pruned before we saw them.
+        """
+        self.storage = storage
+        self.on_changes = on_changes
+        self.interval = interval
+        self._conn = None
+        self._data_version = None
+        # Only report changes made after the feed was created
+        self._version = storage.get_data_version()
+        self._stop_event = threading.Event()
+
+    def poll(self):
+        """Check once; returns the new changes (empty if nothing was committed)"""
+        if self._conn is None:
+            self._conn = self.storage._connect()
+        # Cheap: answered from the WAL index, no table reads
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return []
+        self._data_version = data_version
+
+        changes = self.storage.get_changes_since(self._version)
+        if not changes:
+            return []
+        complete = changes[0]['version'] == self._version + 1
+        self._version = changes[-1]['version']
+        self.on_changes(changes, complete)
+        return changes
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Change feed error: {type(e).__name__}: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_change_feed(storage, on_changes, start_task=None):
+    """
+    Start a ChangeFeed unless MONEY_TRACKER_CHANGE_POLL_MS is 0.
+    start_task(fn) runs the loop (e.g. socketio.start_background_task);
+    defaults to a daemon thread. Returns the feed, or None when disabled.
+    """
+    if CHANGE_POLL_MS <= 0:
+        return None
+    feed = ChangeFeed(storage, on_changes)
+    if start_task:
+        start_task(feed.run)
+    else:
+        threading.Thread(target=feed.run, name='change-feed', daemon=True).start()
+    return feed
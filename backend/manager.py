@@ -1,10 +1,39 @@
 from .storage import Storage
 from .models import Transaction, Budget
+from .query_cache import QueryCache, QUERY_CACHE_SIZE, BALANCE, ALL_TIME, BUDGET_STATUS, ASSETS
 from datetime import datetime
+import os
 
 class FinanceManager:
-    def __init__(self, db_path='money_tracker.db'):
+    def __init__(self, db_path='money_tracker.db', use_asset_snapshots=None, query_cache_size=None):
         self.storage = Storage(db_path)
+        # LRU cache of dashboard reads (MONEY_TRACKER_QUERY_CACHE_SIZE=0 to disable)
+        self.cache = QueryCache(QUERY_CACHE_SIZE if query_cache_size is None else query_cache_size)
+        # Cache end-of-month asset balances in asset_balance_snapshots
+        # (MONEY_TRACKER_ASSET_SNAPSHOTS=0 to always recompute)
+        if use_asset_snapshots is None:
+            use_asset_snapshots = os.getenv('MONEY_TRACKER_ASSET_SNAPSHOTS', '1') != '0'
+        self.use_asset_snapshots = use_asset_snapshots
+        # Set by follow_change_feed(); reads then skip the SQLite version check
+        self.change_feed_syncs_cache = False
+
+    def _cached(self, view, month, compute):
+        if self.cache.max_entries <= 0:
+            return compute()
+        # With a change feed every commit (ours via sync_cache() after the write,
+        # other processes' via the feed) is already applied: serve hits from memory
+        version = self.cache.version if self.change_feed_syncs_cache else self.cache.sync(self.storage)
+        return self.cache.get_or_compute((view, month), compute, version)
+
+    def follow_change_feed(self):
+        """Call once a ChangeFeed runs sync_cache() for every batch of changes"""
+        self.sync_cache()
+        self.change_feed_syncs_cache = True
+
+    def sync_cache(self):
+        """Apply change_log entries (ours and other processes') to the query cache"""
+        if self.cache.max_entries > 0:
+            self.cache.sync(self.storage)
 
     def add_transaction(self, amount, category, type, description, date=None, asset_id=None):
         if not date:
@@ -18,125 +47,78 @@ class FinanceManager:
             asset_id=asset_id
         )
         
-        # Save transaction
-        new_transaction = self.storage.add_transaction(transaction)
-        
-        # If asset_id provided, update asset balance
-        if asset_id:
-            try:
-                # Get current asset details
-                asset = next((a for a in self.storage.get_assets() if str(a['id']) == str(asset_id)), None)
-                if not asset:
-                    print(f"Warning: Asset {asset_id} not found, skipping balance update")
-                    return new_transaction
-                    
-                if type == 'expense':
-                    new_balance = asset['amount'] - transaction.amount
-                else:  # income
-                    new_balance = asset['amount'] + transaction.amount
-                    
-                # Update balance (preserving last_updated_month if exists)
-                self.storage.update_asset_balance(asset['id'], new_balance, asset.get('last_updated_month'))
-            except (KeyError, ValueError, TypeError) as e:
-                print(f"Error updating asset balance for asset {asset_id}: {type(e).__name__}: {e}")
-                # Don't fail the transaction, just log the error
-            except Exception as e:
-                print(f"Unexpected error updating asset balance: {type(e).__name__}: {e}")
-                # Re-raise unexpected errors
-                raise
-                
-        return new_transaction
+        # Save transaction (and shift the linked asset balance in the same commit)
+        transaction = self.storage.add_transaction(transaction)
+        self.sync_cache()
+        return transaction
+
+    def add_transactions_bulk(self, items):
+        """
+        Save many transactions at once (e.g. an AI bulk-extract import).
+        items: dicts with amount, category, type and optional description/date/asset_id.
+        Net asset changes are applied once per asset, all in a single commit.
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        transactions = [
+            Transaction(
+                amount=float(item['amount']),
+                category=item['category'],
+                type=item['type'],
+                description=item.get('description', ''),
+                date=item.get('date') or now,
+                asset_id=item.get('asset_id')
+            )
+            for item in items
+        ]
+        self.storage.add_transactions_bulk(transactions)
+        self.sync_cache()
+        return transactions
 
     def get_recent_transactions(self, month=None):
         if month:
             return self.storage.get_transactions_by_month(month)
         return self.storage.get_transactions()
 
+    def get_aggregates(self, month=None):
+        """Income, expense, net and count for a month (or all time) in one query"""
+        return self.storage.get_aggregates(month)
+
+    def get_transactions_page(self, limit=50, cursor=None, month=None):
+        """One page of transactions (newest first) plus the cursor for the next page"""
+        return self.storage.get_transactions_page(limit, cursor, month)
+
+    def iter_transactions(self, month=None, start_date=None, end_date=None, category=None, chunk_size=500):
+        """Stream filtered transactions in chunks of rows (constant memory)"""
+        return self.storage.iter_transactions(month, start_date, end_date, category, chunk_size)
+
     def get_balance(self, month=None):
-        return self.storage.get_balance(month)
+        return self._cached(BALANCE, month, lambda: self.get_aggregates(month)['net'])
 
     def get_all_time_stats(self):
-        return self.storage.get_all_time_stats()
+        def compute():
+            stats = self.get_aggregates()
+            return {'income': stats['income'], 'expense': stats['expense']}
+        return self._cached(ALL_TIME, None, compute)
 
     def delete_transaction(self, transaction_id):
-        # 1. Fetch transaction details before deletion
-        transaction = self.storage.get_transaction(transaction_id)
-        
-        if transaction and transaction.asset_id:
-            try:
-                # 2. Get current asset details
-                asset = next((a for a in self.storage.get_assets() if str(a['id']) == str(transaction.asset_id)), None)
-                if not asset:
-                    print(f"Warning: Asset {transaction.asset_id} not found during deletion, skipping balance reversal")
-                else:
-                    # 3. Reverse the amount
-                    if transaction.type == 'expense':
-                        # If it was an expense, refund it
-                        new_balance = asset['amount'] + transaction.amount
-                    else:
-                        # If it was income, remove it
-                        new_balance = asset['amount'] - transaction.amount
-                    
-                    self.storage.update_asset_balance(asset['id'], new_balance, asset.get('last_updated_month'))
-            except (KeyError, ValueError, TypeError) as e:
-                print(f"Error reversing asset balance for asset {transaction.asset_id}: {type(e).__name__}: {e}")
-            except Exception as e:
-                print(f"Unexpected error reversing asset balance: {type(e).__name__}: {e}")
-                raise
-
-        # 4. Perform deletion
-        return self.storage.delete_transaction(transaction_id)
+        # Storage reverses the linked asset balance in the same commit
+        old = self.storage.delete_transaction(transaction_id)
+        if old:
+            self.sync_cache()
+        return True
 
     def update_transaction(self, transaction_id, amount, category, type, description, date):
         """Update transaction and properly handle asset balance changes"""
         if not date:
             date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # 1. Get old transaction details BEFORE update
-        old_transaction = self.storage.get_transaction(transaction_id)
-        if not old_transaction:
-            raise ValueError(f"Transaction {transaction_id} not found")
-        
-        # 2. Reverse old asset impact if it had an asset
-        if old_transaction.asset_id:
-            try:
-                asset = next((a for a in self.storage.get_assets() if str(a['id']) == str(old_transaction.asset_id)), None)
-                if asset:
-                    # Reverse the old transaction's effect
-                    if old_transaction.type == 'expense':
-                        # Refund the expense
-                        reversed_balance = asset['amount'] + old_transaction.amount
-                    else:  # income
-                        # Remove the income
-                        reversed_balance = asset['amount'] - old_transaction.amount
-                    
-                    self.storage.update_asset_balance(asset['id'], reversed_balance, asset.get('last_updated_month'))
-            except Exception as e:
-                # Log but don't fail - we'll still update the transaction
-                print(f"Warning: Failed to reverse old asset balance: {e}")
-        
-        # 3. Update the transaction in database
-        self.storage.update_transaction(transaction_id, amount, category, type, description, date)
-        
-        # 4. Apply new asset impact (using the SAME asset_id as before)
+        # Storage moves the asset balance by (new effect - old effect) atomically.
         # Note: Currently we don't support changing asset_id during edit
-        if old_transaction.asset_id:
-            try:
-                asset = next((a for a in self.storage.get_assets() if str(a['id']) == str(old_transaction.asset_id)), None)
-                if asset:
-                    # Apply the new transaction's effect
-                    if type == 'expense':
-                        new_balance = asset['amount'] - float(amount)
-                    else:  # income
-                        new_balance = asset['amount'] + float(amount)
-                    
-                    self.storage.update_asset_balance(asset['id'], new_balance, asset.get('last_updated_month'))
-            except Exception as e:
-                # This is more critical - we should log and potentially rollback
-                print(f"Error: Failed to apply new asset balance: {e}")
-                # Consider rolling back the transaction update here
-                raise
+        old = self.storage.update_transaction(transaction_id, float(amount), category, type, description, date)
+        if not old:
+            raise ValueError(f"Transaction {transaction_id} not found")
         
+        self.sync_cache()
         return True
 
     # Budget management
@@ -149,7 +131,9 @@ class FinanceManager:
             monthly_limit=float(monthly_limit),
             month=month
         )
-        return self.storage.add_budget(budget)
+        budget = self.storage.add_budget(budget)
+        self.sync_cache()
+        return budget
 
     def get_budgets(self, month=None):
         """Get all budgets for a specific month (defaults to current month)"""
@@ -161,7 +145,9 @@ class FinanceManager:
         """Delete budget for a category in a specific month"""
         if month is None:
             month = datetime.now().strftime("%Y-%m")
-        return self.storage.delete_budget(category, month)
+        result = self.storage.delete_budget(category, month)
+        self.sync_cache()
+        return result
 
     def adjust_budget(self, category, amount, month=None):
         """Adjust (increase/decrease) budget for a category"""
@@ -183,7 +169,9 @@ class FinanceManager:
         """Get budget status with spending vs limits and warning levels"""
         if month is None:
             month = datetime.now().strftime("%Y-%m")
-        
+        return self._cached(BUDGET_STATUS, month, lambda: self._get_budget_status(month))
+
+    def _get_budget_status(self, month):
         budgets = self.storage.get_budgets(month)
         spending = self.storage.get_spending_by_category(month)
         
@@ -217,7 +205,7 @@ class FinanceManager:
         if month is None:
             month = datetime.now().strftime("%Y-%m")
         
-        summary = self.storage.get_monthly_summary(month)
+        summary = self.get_aggregates(month)
         spending_by_category = self.storage.get_spending_by_category(month)
         transactions = self.storage.get_transactions_by_month(month)
         
@@ -229,7 +217,9 @@ class FinanceManager:
         }
 
     def save_diary(self, date, content, title=None):
-        return self.storage.save_diary(date, content, title)
+        result = self.storage.save_diary(date, content, title)
+        self.sync_cache()
+        return result
 
     def get_diary(self, date):
         return self.storage.get_diary(date)
@@ -238,17 +228,43 @@ class FinanceManager:
         return self.storage.get_diary_history()
 
     def get_assets(self, month=None):
+        return self._cached(ASSETS, month or None, lambda: self._get_assets(month))
+
+    def _get_assets(self, month=None):
         assets = self.storage.get_assets()
         
         if month:
-            # If a month is provided, calculate the balance as of the end of that month
+            # If a month is provided, use the balance as of the end of that month:
+            # Balance(Month) = CurrentBalance - ChangesMadeAfterMonth, for all assets at once
+            balances = self.storage.get_asset_balances_at(month, use_snapshots=self.use_asset_snapshots)
             for asset in assets:
-                adjustment = self.storage.get_asset_balance_adjustment_after(asset['id'], month)
-                # Balance(Month) = CurrentBalance - ChangesMadeAfterMonth
-                asset['amount'] = asset['amount'] - adjustment
+                asset['amount'] = balances.get(asset['id'], asset['amount'])
                 
         return assets
 
+    # Asset management
+    def add_asset(self, name, type, amount=0, interest_rate=0, term_months=0, start_date=None, end_date=None, auto_contribution=0, last_updated_month=None):
+        """Returns the new asset id, or None if the name is taken"""
+        asset_id = self.storage.add_asset(name, type, amount, interest_rate, term_months, start_date, end_date, auto_contribution, last_updated_month)
+        if asset_id:
+            self.sync_cache()
+        return asset_id
+
+    def update_asset(self, asset_id, name, type, amount=0, interest_rate=0, term_months=0, start_date=None, end_date=None, auto_contribution=0, last_updated_month=None):
+        success = self.storage.update_asset(asset_id, name, type, amount, interest_rate, term_months, start_date, end_date, auto_contribution, last_updated_month)
+        if success:
+            self.sync_cache()
+        return success
+
+    def delete_asset(self, asset_id):
+        result = self.storage.delete_asset(asset_id)
+        self.sync_cache()
+        return result
+
+    def update_asset_balance(self, asset_id, new_amount, last_updated_month=None):
+        self.storage.update_asset_balance(asset_id, new_amount, last_updated_month)
+        self.sync_cache()
+
     def check_recurring_contributions(self, real_current_month):
         """
         Check and process auto-contributions for the given month (YYYY-MM).
@@ -277,7 +293,7 @@ class FinanceManager:
                     
                     # 2. Update Asset
                     new_amount = asset['amount'] + asset['auto_contribution']
-                    self.storage.update_asset_balance(asset['id'], new_amount, real_current_month)
+                    self.update_asset_balance(asset['id'], new_amount, real_current_month)
                     any_processed = True
         return any_processed
 
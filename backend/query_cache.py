@@ -0,0 +1,151 @@
+"""
+In-process LRU cache for FinanceManager read paths
+Entries are keyed by (view, month). Every write logs what it changed in the
+change_log table (Storage._log_change), and sync() applies those entries:
+a transaction in month M drops that month's balance and budget status plus
+the all-time figures, and, if it touches an asset, the asset views for M and
+later months. Because the log is shared through SQLite, writes from other
+gunicorn workers and the Telegram bot invalidate exactly the same entries.
+"""
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+QUERY_CACHE_SIZE = int(os.getenv("MONEY_TRACKER_QUERY_CACHE_SIZE", "256"))  # 0 = disabled
+
+# Views and what invalidates them
+BALANCE = 'balance'            # (BALANCE, month or None): transactions in month (any, for None)
+ALL_TIME = 'all_time'          # (ALL_TIME, None): any transaction
+BUDGET_STATUS = 'budget_status'  # (BUDGET_STATUS, month): budgets or transactions in month
+ASSETS = 'assets'              # (ASSETS, month or None): asset edits, asset-linked transactions <= month
+
+
+class QueryCache:
+    def __init__(self, max_entries=QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; results computed across one are not stored
+        self._generation = 0
+        # Storage data version the entries are valid for
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.resets = 0
+
+    @property
+    def version(self):
+        """Data version of the last sync()"""
+        return self._version
+
+    def get_or_compute(self, key, compute, version):
+        """Cached value for key, or compute() it; version = data version returned by sync()"""
+        if self.max_entries <= 0:
+            return compute()
+        with self._lock:
+            if key in self._entries and version == self._version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._entries[key])
+            self.misses += 1
+            generation = self._generation
+
+        value = compute()
+
+        with self._lock:
+            if generation == self._generation and version == self._version:
+                self._entries[key] = copy.deepcopy(value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def sync(self, storage):
+        """
+        Apply change_log entries written since our version (by any process).
+        Falls back to clearing everything if entries were pruned. Returns the
+        data version the cache now matches.
+        """
+        version = storage.get_data_version()
+        if version == self._version:
+            return version
+        changes = storage.get_changes_since(self._version) if self._version is not None else []
+        with self._lock:
+            if self._version is None:
+                self._version = version
+                return version
+            changes = [c for c in changes if c['version'] > self._version]
+            versions = [c['version'] for c in changes]
+            latest = max([version] + versions)
+            if latest <= self._version:
+                # Another thread already synced this far
+                return self._version
+            self._generation += 1
+            if versions == list(range(self._version + 1, latest + 1)):
+                for change in changes:
+                    self._apply(change)
+            else:
+                # Entries were pruned before we read them: start over
+                self._clear()
+                self.resets += 1
+            self._version = latest
+            return latest
+
+    def _apply(self, change):
+        """Drop the entries one change_log entry can affect (see the view list above)"""
+        if change.get('reset'):
+            self._clear()
+            return
+        months = change.get('months') or []
+        asset_month = change.get('asset_month')
+        budget_month = change.get('budget_month')
+        drop = set()
+        if months:
+            drop.add((ALL_TIME, None))
+            drop.add((BALANCE, None))
+            for month in months:
+                drop.add((BALANCE, month[:7]))
+                drop.add((BUDGET_STATUS, month[:7]))
+        if budget_month:
+            drop.add((BUDGET_STATUS, budget_month[:7]))
+        for key in list(self._entries):
+            view, month = key
+            if view == ASSETS and (change.get('assets') or (asset_month and (month is None or month >= asset_month[:7]))):
+                drop.add(key)
+        for key in drop:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._clear()
+
+    def _clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            by_view = {}
+            for view, _ in self._entries:
+                by_view[view] = by_view.get(view, 0) + 1
+            return {
+                'enabled': self.max_entries > 0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'by_view': by_view,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'resets': self.resets,
+                'data_version': self._version,
+            }
@@ -0,0 +1,261 @@
+"""
+Local rule-based parser for short Vietnamese money phrases
+Handles the common bot messages ("ăn sáng 50k", "lương 20tr", "set food budget 3m")
+without a network call. quick_parse() returns a result in the same shape as
+AIService.parse_magic_prompt plus a confidence score; callers fall back to
+the LLM when the confidence is low.
+"""
+
+import re
+import unicodedata
+from datetime import datetime
+
+# Unit multipliers (keys are diacritic-free, see fold())
+UNITS = {
+    'k': 1_000, 'ngan': 1_000, 'nghin': 1_000,
+    'tr': 1_000_000, 'trieu': 1_000_000, 'm': 1_000_000,
+    'ty': 1_000_000_000,
+}
+
+# "2tr5", "1tr923k", "1.5tr", "500k", "35 triệu", "50.000"
+AMOUNT_RE = re.compile(
+    r'(?<![\w.,])(\d+(?:[.,]\d+)*)\s*(ty|trieu|tr|nghin|ngan|k|m)?(?![a-z])'
+    r'(?:\s*(\d{1,3})\s*(nghin|ngan|k)?(?![\w]))?'
+)
+
+# Keyword -> category, checked in order (more specific phrases first)
+CATEGORY_KEYWORDS = [
+    ('Rent', ['tien nha', 'thue nha', 'tien phong', 'rent']),
+    ('Utilities', ['tien dien', 'tien nuoc', 'internet', 'wifi', 'tien mang', 'dien thoai', 'hoa don', 'gas']),
+    ('Salary', ['luong', 'salary']),
+    ('Bonus', ['tien thuong', 'bonus']),
+    ('Investment', ['dau tu', 'co phieu', 'chung khoan', 'investment']),
+    ('Groceries', ['di cho', 'sieu thi', 'groceries', 'rau', 'thit']),
+    ('Transport', ['grab', 'xang', 'taxi', 'gui xe', 'di lam', 've xe', 'xe buyt', 'bus', 'transport']),
+    ('Food', ['an sang', 'an trua', 'an toi', 'an vat', 'cafe', 'ca phe', 'coffee', 'tra sua', 'pho', 'bun',
+              'com', 'banh mi', 'nhau', 'food']),
+    ('Entertainment', ['xem phim', 'phim', 'game', 'karaoke', 'netflix', 'spotify', 'entertainment']),
+    ('Travel', ['du lich', 'khach san', 've may bay', 'travel']),
+    ('Health', ['thuoc', 'benh vien', 'kham', 'gym', 'health']),
+    ('Shopping', ['quan ao', 'giay', 'shopee', 'lazada', 'sach', 'shopping', 'mua']),
+    ('Other Income', ['duoc cho', 'hoan tien', 'thu ve']),
+]
+
+# Single syllables that fold into ordinary words ("dự án" -> "an", "cá nhân" ->
+# "nhan", "người thương" -> "thuong") only count when typed with their diacritics
+EXACT_CATEGORY_KEYWORDS = {
+    'Bonus': ['thưởng'],
+    'Food': ['ăn'],
+    'Other Income': ['nhận'],
+}
+
+INCOME_CATEGORIES = {'Salary', 'Bonus', 'Investment', 'Other Income'}
+BUDGET_CATEGORIES = {'Food', 'Rent', 'Utilities', 'Transport', 'Groceries', 'Shopping',
+                     'Entertainment', 'Travel', 'Health', 'Other'}
+
+PAYMENT_SOURCES = [
+    # Bare "ví"/"thẻ" fold to "vi"/"the", which collide with "vì"/"thế"
+    ('Cash', ['tien mat', 'cash', 'bang vi', 'tu vi']),
+    ('Bank', ['chuyen khoan', 'ck', 'bank', 'ngan hang', 'quet the', 'bang the', 'the tin dung', 'card']),
+]
+
+BUDGET_WORDS = ['budget', 'ngan sach', 'han muc']
+INCREASE_WORDS = ['tang them', 'them vao', 'cong them', 'increase', 'add']
+DECREASE_WORDS = ['giam bot', 'giam di', 'bot di', 'decrease', 'reduce', 'giam']
+ABSOLUTE_WORDS = ['xuong con', 'chi con', 'set thanh', 'tang len muc', 'doi thanh']
+
+# Anything date-like needs real date arithmetic, so leave it to the LLM
+DATE_HINT_RE = re.compile(
+    r'\b(hom qua|hom kia|ngay mai|mai|tuan truoc|thang truoc|hom truoc|yesterday|tomorrow|ngay \d+)\b'
+    r'|\d{1,2}/\d{1,2}'
+)
+HALF_RE = re.compile(r'\bruoi\b')
+# Time of day in folded text: "8h", "8h30", "8:30", "8 giờ", optionally after "lúc"
+TIME_RE = re.compile(r'(?:\bluc )?\b(\d{1,2})(?:h(\d{2})?|:(\d{2})| ?gio)(?![\w:])')
+
+# Minimum confidence for callers to trust the local result
+DEFAULT_MIN_CONFIDENCE = 0.8
+
+
+def fold(text):
+    """Lowercase, strip Vietnamese diacritics ("đ" -> "d") and collapse whitespace"""
+    text = unicodedata.normalize('NFD', text.lower().replace('đ', 'd'))
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    return ' '.join(text.split())
+
+
+def _has_phrase(folded, phrase):
+    return re.search(r'(?<![\w])' + re.escape(phrase) + r'(?![\w])', folded) is not None
+
+
+def _find_category(text, folded):
+    exact = ' '.join(unicodedata.normalize('NFC', text.lower()).split())
+    for category, phrases in CATEGORY_KEYWORDS:
+        if any(_has_phrase(folded, phrase) for phrase in phrases):
+            return category
+        if any(_has_phrase(exact, phrase) for phrase in EXACT_CATEGORY_KEYWORDS.get(category, [])):
+            return category
+    return None
+
+
+def _parse_time(folded):
+    """(hour, minute, span) of the first time of day in folded text, or None"""
+    match = TIME_RE.search(folded)
+    if not match:
+        return None
+    hour = int(match.group(1))
+    minute = int(match.group(2) or match.group(3) or 0)
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute, match.span()
+
+
+def _find_phrase(folded, groups):
+    for label, phrases in groups:
+        for phrase in phrases:
+            if _has_phrase(folded, phrase):
+                return label, phrase
+    return None, None
+
+
+def _to_number(digits, has_unit):
+    """'50.000' -> 50000, '1.5' (with a unit) -> 1.5, '1,5' (with a unit) -> 1.5"""
+    parts = re.split(r'[.,]', digits)
+    if len(parts) == 1:
+        return float(digits)
+    # Groups of exactly three digits are thousands separators
+    if all(len(p) == 3 for p in parts[1:]):
+        return float(''.join(parts))
+    if has_unit and len(parts) == 2:
+        return float(f"{parts[0]}.{parts[1]}")
+    raise ValueError(f"Ambiguous number: {digits}")
+
+
+def parse_amounts(folded):
+    """All (amount, has_unit, span) found in folded text"""
+    amounts = []
+    for match in AMOUNT_RE.finditer(folded):
+        digits, unit, extra, extra_unit = match.groups()
+        try:
+            value = _to_number(digits, unit is not None)
+        except ValueError:
+            continue
+        multiplier = UNITS.get(unit, 1)
+        value *= multiplier
+        if extra and (unit is None or (extra_unit is None and multiplier < 1_000_000)):
+            # "tháng 9 300k", "cafe 2 30k", "40k 2 người": a bare number next to
+            # another amount, not one amount; report both so the caller sees the
+            # ambiguity (only "2tr5"/"2 triệu 5" carry a fraction of the unit)
+            amounts.append((value, unit is not None, (match.start(1), match.end(2 if unit else 1))))
+            amounts.append((float(extra) * UNITS.get(extra_unit, 1), extra_unit is not None,
+                            (match.start(3), match.end())))
+            continue
+        if extra:
+            if extra_unit:
+                # "1tr923k": the trailing part carries its own (smaller) unit
+                value += float(extra) * UNITS[extra_unit]
+            else:
+                # "2tr5" = 2.5 triệu: trailing digits are a fraction of the unit
+                value += float(extra) / (10 ** len(extra)) * multiplier
+        amounts.append((value, unit is not None or extra_unit is not None, match.span()))
+    return amounts
+
+
+def _describe(text, folded, spans):
+    """Original text minus amount tokens (spans are on folded text of equal word count)"""
+    words = text.split()
+    folded_words = folded.split()
+    if len(words) != len(folded_words):
+        return text.strip()
+    keep = []
+    offset = 0
+    for word, fword in zip(words, folded_words):
+        start = folded.index(fword, offset)
+        end = start + len(fword)
+        offset = end
+        if not any(s < end and start < e for s, e in spans):
+            keep.append(word)
+    return ' '.join(keep).strip() or text.strip()
+
+
+def quick_parse(text, now=None):
+    """
+    Parse a short transaction/budget phrase locally.
+    Returns (result, confidence); result is None when no amount could be found.
+    """
+    if not text or not text.strip():
+        return None, 0.0
+    now = now or datetime.now()
+    folded = fold(text)
+
+    time_of_day = _parse_time(folded)
+    amounts = parse_amounts(folded)
+    if time_of_day:
+        # "8:30", "8 giờ" also look like bare numbers
+        start, end = time_of_day[2]
+        amounts = [a for a in amounts if not (a[2][0] < end and start < a[2][1])]
+    if not amounts:
+        return None, 0.0
+
+    confidence = 1.0
+    amount, has_unit, span = amounts[0]
+    if len(amounts) > 1:
+        confidence = min(confidence, 0.3)
+    if not has_unit:
+        confidence -= 0.2
+    if HALF_RE.search(folded):
+        # "rưỡi" readings are subtle; the LLM prompt has explicit examples for them
+        confidence = min(confidence, 0.4)
+    if DATE_HINT_RE.search(folded) or (TIME_RE.search(folded) and not time_of_day):
+        # "25h", "8:75": not a time we can read either
+        confidence = min(confidence, 0.3)
+
+    category = _find_category(text, folded)
+
+    if any(_has_phrase(folded, w) for w in BUDGET_WORDS):
+        if category not in BUDGET_CATEGORIES:
+            confidence = min(confidence, 0.3)
+            category = category or 'Other'
+        adjustment = None
+        if any(_has_phrase(folded, w) for w in ABSOLUTE_WORDS):
+            adjustment = None
+        elif any(_has_phrase(folded, w) for w in INCREASE_WORDS):
+            adjustment = 'increase'
+        elif any(_has_phrase(folded, w) for w in DECREASE_WORDS):
+            adjustment = 'decrease'
+        return {
+            'intent': 'budget',
+            'category': category,
+            'monthly_limit': amount,
+            'adjustment': adjustment,
+            'month': now.strftime("%Y-%m"),
+        }, max(confidence, 0.0)
+
+    if any(_has_phrase(folded, w) for w in INCREASE_WORDS + DECREASE_WORDS + ABSOLUTE_WORDS):
+        # Probably a budget change phrased without "budget" ("giảm food xuống còn 1 triệu")
+        confidence = min(confidence, 0.3)
+
+    if category is None:
+        category = 'Other'
+        confidence = min(confidence, 0.5)
+
+    payment_source, payment_phrase = _find_phrase(folded, PAYMENT_SOURCES)
+    spans = [a[2] for a in amounts]
+    if payment_phrase:
+        match = re.search(r'(?<![\w])' + re.escape(payment_phrase) + r'(?![\w])', folded)
+        spans.append(match.span())
+    date = now
+    if time_of_day:
+        # "cafe 30k lúc 8h30": today, at the time named in the text
+        date = now.replace(hour=time_of_day[0], minute=time_of_day[1])
+        spans.append(time_of_day[2])
+
+    return {
+        'intent': 'transaction',
+        'amount': amount,
+        'category': category,
+        'type': 'income' if category in INCOME_CATEGORIES else 'expense',
+        'description': _describe(text, folded, spans),
+        'date': date.strftime("%Y-%m-%dT%H:%M"),
+        'payment_source': payment_source,
+    }, max(confidence, 0.0)
@@ -1,21 +1,220 @@
 import sqlite3
 import os
+import re
+import atexit
+import base64
+import json
+import threading
+import time
+from datetime import date as date_cls, timedelta
 from contextlib import contextmanager
 from .models import Transaction, Budget
 
+# Performance profiles accepted by Storage.init_db().
+# "concurrent" uses WAL so the web app and the Telegram bot can write to the
+# same file without readers queueing behind writers.
+PRAGMA_PROFILES = {
+    'concurrent': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,          # negative = KiB, so ~16 MB
+        'mmap_size': 64 * 1024 * 1024,
+        'busy_timeout': 5000,          # ms to wait on a locked database
+        'wal_autocheckpoint': 1000,    # pages
+        'checkpoint_interval': 300,    # seconds between explicit checkpoints
+    },
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'busy_timeout': 5000,
+        'wal_autocheckpoint': 1000,
+        'checkpoint_interval': 0,
+    },
+}
+DEFAULT_PROFILE = os.getenv('MONEY_TRACKER_DB_PROFILE', 'concurrent')
+
+# Bumped whenever init_db() needs to run a one-off data migration
+# (stored in PRAGMA user_version).
+#   1: monthly_category_totals rollup populated from existing transactions
+SCHEMA_VERSION = 1
+
+# change_log keeps roughly the last CHANGE_LOG_KEEP writes; a process that falls
+# further behind than that simply drops its whole cache.
+CHANGE_LOG_KEEP = 1000
+CHANGE_LOG_PRUNE_EVERY = 100
+
+MONTH_RE = re.compile(r'\d{4}-(0[1-9]|1[0-2])\Z')
+
+
+def month_bounds(month):
+    """
+    Half-open range [start, end) covering every date string in month (YYYY-MM).
+    Dates are stored as 'YYYY-MM-DD...' text, so `date >= start AND date < end`
+    matches the same rows as `date LIKE month || '%'` but can use an index.
+    """
+    if not isinstance(month, str) or not MONTH_RE.match(month):
+        raise ValueError(f"Invalid month: {month}")
+    year, mon = int(month[:4]), int(month[5:7])
+    next_year, next_mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    return f"{year:04d}-{mon:02d}", f"{next_year:04d}-{next_mon:02d}"
+
+def encode_cursor(date, transaction_id):
+    """Opaque pagination cursor for the (date, id) position of a transaction"""
+    raw = json.dumps([date, transaction_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); raises ValueError for malformed cursors"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, transaction_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(date, str) or not isinstance(transaction_id, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return date, transaction_id
+
+
+def signed_amount(type, amount):
+    """Effect of a transaction on an asset balance: income adds, expense subtracts"""
+    return amount if type == 'income' else -amount
+
+
 class Storage:
-    def __init__(self, db_path='money_tracker.db'):
+    # Prepared statements kept per pooled connection (sqlite3 default is 128)
+    STATEMENT_CACHE_SIZE = 256
+
+    def __init__(self, db_path='money_tracker.db', profile=None):
         self.db_path = db_path
-        self.init_db()
+        self.profile_name = None
+        self.pragmas = {}
+        self._last_checkpoint = time.monotonic()
+        self._last_checkpoint_result = None
+        # One long-lived connection per thread (gunicorn worker threads, the
+        # bot's event loop), mapped to the thread using it. A thread that exits
+        # leaves its connection for the next new thread; close() shuts them all down.
+        self._local = threading.local()
+        self._pool = {}
+        self._pool_lock = threading.Lock()
+        self._pid = os.getpid()
+        self.init_db(profile)
+        atexit.register(self.close)
+
+    def _connect(self):
+        """Open a new connection with row factory and pragmas applied"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False, # close() may run from another thread
+            cached_statements=self.STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        self._apply_pragmas(conn)
+        return conn
+
+    def _apply_pragmas(self, conn):
+        """Per-connection settings, applied once when the connection is opened"""
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if not self.pragmas:
+            return
+        conn.execute(f"PRAGMA busy_timeout = {int(self.pragmas['busy_timeout'])}")
+        conn.execute(f"PRAGMA synchronous = {self.pragmas['synchronous']}")
+        conn.execute(f"PRAGMA cache_size = {int(self.pragmas['cache_size'])}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.pragmas['mmap_size'])}")
+        conn.execute(f"PRAGMA wal_autocheckpoint = {int(self.pragmas['wal_autocheckpoint'])}")
+
+    @staticmethod
+    def resolve_profile(profile=None):
+        """Turn a profile name or a dict of overrides into (name, pragmas)"""
+        if profile is None:
+            profile = DEFAULT_PROFILE
+        if isinstance(profile, dict):
+            base = profile.get('base', DEFAULT_PROFILE)
+            pragmas = dict(PRAGMA_PROFILES[base])
+            pragmas.update({k: v for k, v in profile.items() if k != 'base'})
+            return f"{base}+custom", pragmas
+        if profile not in PRAGMA_PROFILES:
+            raise ValueError(f"Unknown storage profile: {profile}")
+        return profile, dict(PRAGMA_PROFILES[profile])
+
+    def _reset_after_fork(self):
+        """Drop connections inherited from the parent process.
+
+        SQLite handles must never be used (or closed) across fork(), so the
+        child simply forgets them and opens its own on demand.
+        """
+        self._local = threading.local()
+        self._pool = {}
+        self._pool_lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _checkout(self):
+        """
+        Connection for the current thread: one left by a thread that has exited
+        (the dev server starts a thread per request), else a new one. The pool
+        therefore never grows past the peak number of concurrent threads.
+        """
+        current = threading.current_thread()
+        with self._pool_lock:
+            for conn, owner in self._pool.items():
+                if not owner.is_alive():
+                    self._pool[conn] = current
+                    return conn
+        conn = self._connect()
+        with self._pool_lock:
+            self._pool[conn] = current
+        return conn
 
     @contextmanager
     def _conn(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._checkout()
+            self._local.conn = conn
         try:
             yield conn
+        except Exception:
+            conn.rollback()
+            raise
         finally:
-            conn.close()
+            # Connections used to be closed here, which discarded anything left
+            # uncommitted. Keep that behaviour now that they are reused.
+            if conn.in_transaction:
+                conn.rollback()
+            self._maybe_checkpoint(conn)
+
+    def _maybe_checkpoint(self, conn):
+        """Run a passive WAL checkpoint when the profile's interval has elapsed"""
+        interval = self.pragmas.get('checkpoint_interval')
+        if not interval or self.pragmas.get('journal_mode', '').upper() != 'WAL':
+            return
+        if time.monotonic() - self._last_checkpoint < interval:
+            return
+        self.checkpoint(conn=conn)
+
+    def checkpoint(self, mode='PASSIVE', conn=None):
+        """Copy WAL frames back into the main database file.
+
+        Returns (busy, wal_pages, checkpointed_pages) as reported by SQLite.
+        """
+        if mode.upper() not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f"Invalid checkpoint mode: {mode}")
+        if conn is None:
+            with self._conn() as conn:
+                return self.checkpoint(mode, conn)
+        self._last_checkpoint = time.monotonic()
+        try:
+            row = conn.execute(f"PRAGMA wal_checkpoint({mode.upper()})").fetchone()
+        except sqlite3.OperationalError as e:
+            print(f"WAL checkpoint failed: {e}")
+            return None
+        self._last_checkpoint_result = tuple(row) if row else None
+        return self._last_checkpoint_result
 
     def _get_conn(self):
         """Deprecated: Use _conn() context manager instead"""
@@ -23,8 +222,33 @@ class Storage:
         conn.row_factory = sqlite3.Row
         return conn
 
-    def init_db(self):
+    def close(self):
+        """Close every pooled connection (called automatically at exit)"""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+            return
+        with self._pool_lock:
+            pool, self._pool = self._pool, {}
+        for conn in pool:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def init_db(self, profile=None):
+        """Create/migrate the schema and apply a performance profile.
+
+        `profile` is a key of PRAGMA_PROFILES or a dict of pragma overrides
+        (optionally with a 'base' profile name).
+        """
+        self.profile_name, self.pragmas = self.resolve_profile(profile)
+        # Connections opened under a previous profile carry stale pragmas
+        self.close()
+
         with self._conn() as conn:
+            # journal_mode is persistent in the database file, so set it once here
+            conn.execute(f"PRAGMA journal_mode = {self.pragmas['journal_mode']}")
             cursor = conn.cursor()
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS transactions (
@@ -113,11 +337,210 @@ class Storage:
             
             # Performance Indexes
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_asset ON transactions(asset_id)")
+            # Composite indexes for the month-range filters in the reporting queries
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_type_date ON transactions(type, date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_category_date ON transactions(category, date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_asset_date ON transactions(asset_id, date)")
+            # Superseded by idx_transactions_asset_date
+            cursor.execute("DROP INDEX IF EXISTS idx_transactions_asset")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_diary_date ON diary(date)")
+
+            # Rollup of transactions per (month, category, type), kept in sync by
+            # every transaction write so reports never scan the raw table.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS monthly_category_totals (
+                    month TEXT NOT NULL, -- 'YYYY-MM'
+                    category TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    total REAL NOT NULL DEFAULT 0,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (month, category, type)
+                )
+            ''')
+
+            # Optional cache of end-of-month asset balances (see get_asset_balances_at).
+            # Rows are deleted whenever a write could change them.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS asset_balance_snapshots (
+                    month TEXT NOT NULL, -- 'YYYY-MM'
+                    asset_id INTEGER NOT NULL,
+                    amount REAL NOT NULL,
+                    PRIMARY KEY (month, asset_id)
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_asset_snapshots_asset ON asset_balance_snapshots(asset_id, month)")
+
+            # Cached AI parse results (see ai_cache.PromptCache)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS ai_prompt_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL, -- JSON
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_prompt_cache_last_used ON ai_prompt_cache(last_used)")
+
+            # Small key/value counters; data_version goes up with every user-data write
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0)")
+
+            # One row per data_version bump, for cross-process invalidation (pruned as it grows)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS change_log (
+                    version INTEGER PRIMARY KEY,
+                    pid INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    type TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    details TEXT NOT NULL -- JSON
+                )
+            ''')
+
+            # One-off migrations
+            cursor.execute("PRAGMA user_version")
+            version = cursor.fetchone()[0]
+            if version < 1:
+                self._rebuild_rollups(cursor)
+            if version < SCHEMA_VERSION:
+                cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
             
             conn.commit()
 
+    # Rollup maintenance
+    def _apply_rollup(self, cursor, date, category, type, amount, count=1):
+        """Add (or with count=-1, remove) one transaction's effect on the rollup"""
+        month = date[:7]
+        self._upsert_rollups(cursor, [(month, category, type, amount * count, count)])
+        if count < 0:
+            cursor.execute('''
+                DELETE FROM monthly_category_totals
+                WHERE month = ? AND category = ? AND type = ? AND count <= 0
+            ''', (month, category, type))
+
+    def _upsert_rollups(self, cursor, rows):
+        """rows: iterable of (month, category, type, total_delta, count_delta)"""
+        cursor.executemany('''
+            INSERT INTO monthly_category_totals (month, category, type, total, count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(month, category, type)
+            DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+        ''', rows)
+
+    def _rebuild_rollups(self, cursor):
+        cursor.execute("DELETE FROM monthly_category_totals")
+        cursor.execute('''
+            INSERT INTO monthly_category_totals (month, category, type, total, count)
+            SELECT substr(date, 1, 7), category, type, SUM(amount), COUNT(*)
+            FROM transactions
+            GROUP BY substr(date, 1, 7), category, type
+        ''')
+
+    def _apply_asset_delta(self, cursor, asset_id, delta):
+        """Shift an asset's balance in place (no read-modify-write race)"""
+        if not asset_id or not delta:
+            return
+        cursor.execute("UPDATE assets SET amount = amount + ? WHERE id = ?", (delta, asset_id))
+        if cursor.rowcount == 0:
+            print(f"Warning: Asset {asset_id} not found, skipping balance update")
+
+    def _log_change(self, cursor, type, action, **details):
+        """
+        Call inside every write transaction that changes user data. Bumps
+        data_version (caches/ETags key on it) and appends a change_log row that
+        other processes read to invalidate their caches and notify clients
+        (see change_feed.py). details, as used by QueryCache.apply: months,
+        asset_month, budget_month, assets, reset; plus ids/dates for clients.
+        """
+        version = cursor.execute(
+            "UPDATE meta SET value = value + 1 WHERE key = 'data_version' RETURNING value"
+        ).fetchall()[0][0]
+        cursor.execute(
+            "INSERT INTO change_log (version, pid, created_at, type, action, details) VALUES (?, ?, ?, ?, ?, ?)",
+            (version, os.getpid(), time.time(), type, action, json.dumps(details))
+        )
+        if version % CHANGE_LOG_PRUNE_EVERY == 0:
+            cursor.execute("DELETE FROM change_log WHERE version <= ?", (version - CHANGE_LOG_KEEP,))
+        return version
+
+    def get_data_version(self):
+        """Counter that changes whenever transactions, budgets, assets or the diary change"""
+        with self._conn() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+            return row[0] if row else 0
+
+    def get_changes_since(self, version):
+        """change_log entries newer than version, oldest first (older ones may have been pruned)"""
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT version, pid, created_at, type, action, details FROM change_log WHERE version > ? ORDER BY version",
+                (version,)
+            ).fetchall()
+        changes = []
+        for row in rows:
+            change = json.loads(row['details'])
+            change.update(version=row['version'], pid=row['pid'], created_at=row['created_at'],
+                          type=row['type'], action=row['action'])
+            changes.append(change)
+        return changes
+
+    def _invalidate_asset_snapshots(self, cursor, asset_id, from_month=None):
+        """
+        Drop cached end-of-month balances for an asset. A transaction dated in
+        month M only changes the balances at the end of M and later months.
+        """
+        if not asset_id:
+            return
+        if from_month:
+            cursor.execute("DELETE FROM asset_balance_snapshots WHERE asset_id = ? AND month >= ?", (asset_id, from_month[:7]))
+        else:
+            cursor.execute("DELETE FROM asset_balance_snapshots WHERE asset_id = ?", (asset_id,))
+
+    def rebuild_rollups(self):
+        """Recompute monthly_category_totals from the raw transactions"""
+        with self._conn() as conn:
+            cursor = conn.cursor()
+            self._rebuild_rollups(cursor)
+            self._log_change(cursor, 'rollups', 'rebuild', reset=True)
+            conn.commit()
+            return True
+
+    def verify_rollups(self, tolerance=0.005):
+        """
+        Compare monthly_category_totals against the raw transactions.
+        Returns a list of mismatching (month, category, type) rows; empty means in sync.
+        """
+        with self._conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT substr(date, 1, 7) as month, category, type, SUM(amount) as total, COUNT(*) as count
+                FROM transactions
+                GROUP BY substr(date, 1, 7), category, type
+            ''')
+            expected = {(r['month'], r['category'], r['type']): (r['total'], r['count']) for r in cursor.fetchall()}
+            cursor.execute("SELECT month, category, type, total, count FROM monthly_category_totals")
+            actual = {(r['month'], r['category'], r['type']): (r['total'], r['count']) for r in cursor.fetchall()}
+
+            mismatches = []
+            for key in sorted(set(expected) | set(actual)):
+                exp_total, exp_count = expected.get(key, (0.0, 0))
+                act_total, act_count = actual.get(key, (0.0, 0))
+                if exp_count != act_count or abs(exp_total - act_total) > tolerance:
+                    mismatches.append({
+                        'month': key[0],
+                        'category': key[1],
+                        'type': key[2],
+                        'expected': {'total': exp_total, 'count': exp_count},
+                        'actual': {'total': act_total, 'count': act_count}
+                    })
+            return mismatches
+
     def add_transaction(self, transaction: Transaction):
         with self._conn() as conn:
             cursor = conn.cursor()
@@ -126,9 +549,49 @@ class Storage:
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (transaction.amount, transaction.category, transaction.type, transaction.description, transaction.date, transaction.asset_id))
             transaction.id = cursor.lastrowid
+            self._apply_rollup(cursor, transaction.date, transaction.category, transaction.type, transaction.amount)
+            self._apply_asset_delta(cursor, transaction.asset_id, signed_amount(transaction.type, transaction.amount))
+            self._invalidate_asset_snapshots(cursor, transaction.asset_id, transaction.date)
+            self._log_change(cursor, 'transaction', 'add', id=transaction.id, months=[transaction.date[:7]],
+                             asset_month=transaction.date[:7] if transaction.asset_id else None)
             conn.commit()
             return transaction
 
+    def add_transactions_bulk(self, transactions):
+        """
+        Insert many transactions in one commit.
+        Rollup rows and asset balances are updated once per group/asset with the
+        net change, rather than once per transaction.
+        """
+        if not transactions:
+            return 0
+
+        rollups = {}
+        asset_deltas = {}
+        asset_first_month = {}
+        for t in transactions:
+            key = (t.date[:7], t.category, t.type)
+            total, count = rollups.get(key, (0.0, 0))
+            rollups[key] = (total + t.amount, count + 1)
+            if t.asset_id:
+                asset_deltas[t.asset_id] = asset_deltas.get(t.asset_id, 0.0) + signed_amount(t.type, t.amount)
+                asset_first_month[t.asset_id] = min(asset_first_month.get(t.asset_id, t.date[:7]), t.date[:7])
+
+        with self._conn() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO transactions (amount, category, type, description, date, asset_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(t.amount, t.category, t.type, t.description, t.date, t.asset_id) for t in transactions])
+            self._upsert_rollups(cursor, [key + value for key, value in rollups.items()])
+            for asset_id, delta in asset_deltas.items():
+                self._apply_asset_delta(cursor, asset_id, delta)
+                self._invalidate_asset_snapshots(cursor, asset_id, asset_first_month[asset_id])
+            self._log_change(cursor, 'transaction', 'bulk_add', count=len(transactions), months=sorted({key[0] for key in rollups}),
+                             asset_month=min(asset_first_month.values()) if asset_first_month else None)
+            conn.commit()
+            return len(transactions)
+
     def get_transactions(self):
         with self._conn() as conn:
             cursor = conn.cursor()
@@ -147,40 +610,116 @@ class Storage:
                 ))
             return transactions
 
-    def get_balance(self, month=None):
+    def get_aggregates(self, month=None):
+        """
+        Income, expense, net and count in a single pass over the monthly rollup.
+        Covers one month (YYYY-MM) if given, otherwise all time.
+        """
+        query = '''
+            SELECT
+                SUM(CASE WHEN type = 'income' THEN total ELSE 0 END) as income,
+                SUM(CASE WHEN type = 'expense' THEN total ELSE 0 END) as expense,
+                SUM(count) as count
+            FROM monthly_category_totals
+        '''
+        params = ()
+        if month:
+            query += " WHERE month = ?"
+            params = (month_bounds(month)[0],)
+
         with self._conn() as conn:
-            cursor = conn.cursor()
-            income_query = "SELECT SUM(amount) FROM transactions WHERE type='income'"
-            expense_query = "SELECT SUM(amount) FROM transactions WHERE type='expense'"
-            params = []
-            
-            if month:
-                income_query += " AND date LIKE ? || '%'"
-                expense_query += " AND date LIKE ? || '%'"
-                params.append(month)
-                
-            cursor.execute(income_query, params)
-            res = cursor.fetchone()
-            income = res[0] if res and res[0] is not None else 0.0
-            
-            cursor.execute(expense_query, params)
-            res = cursor.fetchone()
-            expense = res[0] if res and res[0] is not None else 0.0
-            
-            return income - expense
+            row = conn.execute(query, params).fetchone()
+            income = row['income'] or 0.0
+            expense = row['expense'] or 0.0
+            return {
+                'income': income,
+                'expense': expense,
+                'net': income - expense,
+                'count': row['count'] or 0
+            }
+
+    def get_transactions_page(self, limit=50, cursor=None, month=None):
+        """
+        Keyset-paginated transactions, newest first (ordered by date, then id).
+        Returns (transactions, next_cursor); next_cursor is None on the last page.
+        """
+        query = "SELECT * FROM transactions WHERE 1 = 1"
+        params = []
+        if month:
+            query += " AND date >= ? AND date < ?"
+            params.extend(month_bounds(month))
+        if cursor:
+            after_date, after_id = decode_cursor(cursor)
+            # Equivalent to (date, id) < (after_date, after_id), written so the
+            # date bound stays a range on idx_transactions_date
+            query += " AND date <= ? AND (date < ? OR id < ?)"
+            params.extend([after_date, after_date, after_id])
+        query += " ORDER BY date DESC, id DESC LIMIT ?"
+        # One extra row tells us whether another page exists
+        params.append(limit + 1)
 
-    def get_all_time_stats(self):
         with self._conn() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT SUM(amount) FROM transactions WHERE type='income'")
-            res_income = cursor.fetchone()
-            income = res_income[0] if res_income and res_income[0] is not None else 0.0
-            
-            cursor.execute("SELECT SUM(amount) FROM transactions WHERE type='expense'")
-            res_expense = cursor.fetchone()
-            expense = res_expense[0] if res_expense and res_expense[0] is not None else 0.0
-            
-            return {"income": income, "expense": expense}
+            rows = conn.execute(query, params).fetchall()
+            transactions = [self._row_to_transaction(row) for row in rows[:limit]]
+            next_cursor = None
+            if len(rows) > limit:
+                last = transactions[-1]
+                next_cursor = encode_cursor(last.date, last.id)
+            return transactions, next_cursor
+
+    def iter_transactions(self, month=None, start_date=None, end_date=None, category=None, chunk_size=500):
+        """
+        Stream transactions (newest first) as lists of at most chunk_size rows.
+        start_date/end_date are inclusive 'YYYY-MM-DD' bounds.
+
+        Uses its own short-lived connection so a slow consumer (e.g. a CSV
+        download) never holds a pooled connection mid-read.
+        """
+        query = "SELECT id, date, category, type, amount, description, asset_id FROM transactions WHERE 1 = 1"
+        params = []
+        if month:
+            query += " AND date >= ? AND date < ?"
+            params.extend(month_bounds(month))
+        if start_date:
+            query += " AND date >= ?"
+            params.append(date_cls.fromisoformat(start_date).isoformat())
+        if end_date:
+            query += " AND date < ?"
+            params.append((date_cls.fromisoformat(end_date) + timedelta(days=1)).isoformat())
+        if category:
+            query += " AND category = ?"
+            params.append(category)
+        query += " ORDER BY date DESC, id DESC"
+
+        conn = self._connect()
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_transaction(row):
+        return Transaction(
+            id=row['id'],
+            amount=row['amount'],
+            category=row['category'],
+            type=row['type'],
+            description=row['description'],
+            date=row['date'],
+            asset_id=row['asset_id']
+        )
+
+    def get_balance(self, month=None):
+        return self.get_aggregates(month)['net']
+
+    def get_all_time_stats(self):
+        stats = self.get_aggregates()
+        return {"income": stats['income'], "expense": stats['expense']}
 
     def get_transaction(self, transaction_id):
         with self._conn() as conn:
@@ -200,22 +739,57 @@ class Storage:
             return None
 
     def delete_transaction(self, transaction_id):
+        """
+        Delete a transaction and reverse its effect on its asset in one commit.
+        Returns the deleted row as a dict (None if it didn't exist).
+        """
         with self._conn() as conn:
             cursor = conn.cursor()
+            # Take the write lock up front so the row can't change between read and delete
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT amount, category, type, date, asset_id FROM transactions WHERE id = ?", (transaction_id,))
+            old = cursor.fetchone()
             cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
+            if old:
+                self._apply_rollup(cursor, old['date'], old['category'], old['type'], old['amount'], count=-1)
+                self._apply_asset_delta(cursor, old['asset_id'], -signed_amount(old['type'], old['amount']))
+                self._invalidate_asset_snapshots(cursor, old['asset_id'], old['date'])
+                self._log_change(cursor, 'transaction', 'delete', id=transaction_id, months=[old['date'][:7]],
+                                 asset_month=old['date'][:7] if old['asset_id'] else None)
             conn.commit()
-            return True
+            return dict(old) if old else None
 
     def update_transaction(self, transaction_id, amount, category, type, description, date):
+        """
+        Update a transaction and move its asset balance by the difference, in one commit.
+        The asset link itself is not changed. Returns the row as it was before the
+        update (a dict), or None if the transaction doesn't exist.
+        """
+        amount = float(amount)
         with self._conn() as conn:
             cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT amount, category, type, date, asset_id FROM transactions WHERE id = ?", (transaction_id,))
+            old = cursor.fetchone()
+            if not old:
+                conn.rollback()
+                return None
             cursor.execute('''
                 UPDATE transactions
                 SET amount = ?, category = ?, type = ?, description = ?, date = ?
                 WHERE id = ?
             ''', (amount, category, type, description, date, transaction_id))
+            self._apply_rollup(cursor, old['date'], old['category'], old['type'], old['amount'], count=-1)
+            self._apply_rollup(cursor, date, category, type, amount)
+            self._apply_asset_delta(
+                cursor, old['asset_id'],
+                signed_amount(type, amount) - signed_amount(old['type'], old['amount'])
+            )
+            self._invalidate_asset_snapshots(cursor, old['asset_id'], min(old['date'][:7], date[:7]))
+            self._log_change(cursor, 'transaction', 'update', id=transaction_id, months=sorted({old['date'][:7], date[:7]}),
+                             asset_month=min(old['date'][:7], date[:7]) if old['asset_id'] else None)
             conn.commit()
-            return True
+            return dict(old)
 
     # Budget methods
     def add_budget(self, budget: Budget):
@@ -227,6 +801,7 @@ class Storage:
                     VALUES (?, ?, ?)
                 ''', (budget.category, budget.monthly_limit, budget.month))
                 budget.id = cursor.lastrowid
+                self._log_change(cursor, 'budget', 'set', category=budget.category, budget_month=budget.month)
                 conn.commit()
             except sqlite3.IntegrityError:
                 # Budget already exists for this category/month, update it
@@ -235,6 +810,7 @@ class Storage:
                     SET monthly_limit = ?
                     WHERE category = ? AND month = ?
                 ''', (budget.monthly_limit, budget.category, budget.month))
+                self._log_change(cursor, 'budget', 'set', category=budget.category, budget_month=budget.month)
                 conn.commit()
             return budget
 
@@ -260,6 +836,7 @@ class Storage:
         with self._conn() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM budgets WHERE category = ? AND month = ?", (category, month))
+            self._log_change(cursor, 'budget', 'delete', category=category, budget_month=month)
             conn.commit()
             return True
 
@@ -269,46 +846,16 @@ class Storage:
         with self._conn() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT category, SUM(amount) as total
-                FROM transactions
-                WHERE type = 'expense' AND date LIKE ? || '%'
-                GROUP BY category
-            ''', (month,))
+                SELECT category, total
+                FROM monthly_category_totals
+                WHERE month = ? AND type = 'expense'
+            ''', (month_bounds(month)[0],))
             rows = cursor.fetchall()
             return {row['category']: row['total'] for row in rows}
 
     def get_monthly_summary(self, month):
         """Get income, expense, and transaction count for a specific month"""
-        with self._conn() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT SUM(amount) as total
-                FROM transactions
-                WHERE type = 'income' AND date LIKE ? || '%'
-            ''', (month,))
-            income = cursor.fetchone()['total'] or 0.0
-            
-            cursor.execute('''
-                SELECT SUM(amount) as total
-                FROM transactions
-                WHERE type = 'expense' AND date LIKE ? || '%'
-            ''', (month,))
-            expense = cursor.fetchone()['total'] or 0.0
-            
-            cursor.execute('''
-                SELECT COUNT(*) as count
-                FROM transactions
-                WHERE date LIKE ? || '%'
-            ''', (month,))
-            count = cursor.fetchone()['count']
-            
-            return {
-                'income': income,
-                'expense': expense,
-                'net': income - expense,
-                'count': count
-            }
+        return self.get_aggregates(month)
 
     def get_transactions_by_month(self, month):
         """Get all transactions for a specific month"""
@@ -316,9 +863,9 @@ class Storage:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT * FROM transactions
-                WHERE date LIKE ? || '%'
+                WHERE date >= ? AND date < ?
                 ORDER BY date DESC
-            ''', (month,))
+            ''', month_bounds(month))
             rows = cursor.fetchall()
             transactions = []
             for row in rows:
@@ -354,6 +901,7 @@ class Storage:
                         WHERE date = ?
                     ''', (content, title, date))
             
+            self._log_change(cursor, 'diary', 'save', date=date)
             conn.commit()
             return True
 
@@ -402,18 +950,17 @@ class Storage:
         with self._conn() as conn:
             cursor = conn.cursor()
             
-            # We want transactions happening AFTER this month.
-            # SQLite comparison: '2026-02' > '2026-01' works.
-            # But '2026-01-15' starts with '2026-01'.
-            # We want anything where date >= 'YYYY-(MM+1)-01'
-            # Easier: date NOT LIKE 'YYYY-MM%' AND date > 'YYYY-MM'
+            # We want transactions happening AFTER this month, i.e. anything
+            # where date >= 'YYYY-(MM+1)'. Comparing the raw column (instead of
+            # substr(date, 1, 7)) lets SQLite use idx_transactions_asset_date.
+            _, next_month = month_bounds(month)
             
             cursor.execute('''
                 SELECT type, SUM(amount) as total
                 FROM transactions
-                WHERE asset_id = ? AND substr(date, 1, 7) > ?
+                WHERE asset_id = ? AND date >= ?
                 GROUP BY type
-            ''', (asset_id, month))
+            ''', (asset_id, next_month))
             
             rows = cursor.fetchall()
             
@@ -425,6 +972,71 @@ class Storage:
                     adjustment -= row['total']
             return adjustment
     
+    def get_asset_adjustments_after(self, month):
+        """
+        Net change per asset from transactions after the given month (YYYY-MM),
+        for all assets in one grouped query. Returns {asset_id: adjustment}.
+        """
+        _, next_month = month_bounds(month)
+        with self._conn() as conn:
+            return self._asset_adjustments_after(conn.cursor(), next_month)
+
+    def _asset_adjustments_after(self, cursor, next_month):
+        # Only the recent tail of the table is after the month, so drive the
+        # query by the date range; left to itself the planner picks
+        # idx_transactions_asset_date and walks every asset-linked row.
+        cursor.execute('''
+            SELECT asset_id, type, SUM(amount) as total
+            FROM transactions INDEXED BY idx_transactions_date
+            WHERE date >= ? AND asset_id IS NOT NULL
+            GROUP BY asset_id, type
+        ''', (next_month,))
+        adjustments = {}
+        for row in cursor.fetchall():
+            adjustments[row['asset_id']] = adjustments.get(row['asset_id'], 0.0) + signed_amount(row['type'], row['total'])
+        return adjustments
+
+    def get_asset_balances_at(self, month, use_snapshots=True):
+        """
+        Balance of every asset at the end of month (YYYY-MM): {asset_id: amount}.
+
+        With use_snapshots, a complete set of cached balances is returned
+        directly; otherwise balances are derived from current amounts minus the
+        grouped after-month adjustments and cached for next time.
+        """
+        _, next_month = month_bounds(month)
+        with self._conn() as conn:
+            cursor = conn.cursor()
+            # Read everything from one consistent snapshot of the database
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT id, amount FROM assets")
+            current = {row['id']: row['amount'] for row in cursor.fetchall()}
+
+            if use_snapshots:
+                cursor.execute("SELECT asset_id, amount FROM asset_balance_snapshots WHERE month = ?", (month,))
+                cached = {row['asset_id']: row['amount'] for row in cursor.fetchall()}
+                if current and all(asset_id in cached for asset_id in current):
+                    conn.rollback()
+                    return {asset_id: cached[asset_id] for asset_id in current}
+
+            adjustments = self._asset_adjustments_after(cursor, next_month)
+            balances = {asset_id: amount - adjustments.get(asset_id, 0.0) for asset_id, amount in current.items()}
+
+            if use_snapshots and balances:
+                try:
+                    cursor.executemany(
+                        "INSERT OR REPLACE INTO asset_balance_snapshots (month, asset_id, amount) VALUES (?, ?, ?)",
+                        [(month, asset_id, amount) for asset_id, amount in balances.items()]
+                    )
+                    conn.commit()
+                except sqlite3.OperationalError:
+                    # Another writer committed since our read began; the result is
+                    # still correct for that snapshot, just don't cache it.
+                    conn.rollback()
+            else:
+                conn.rollback()
+            return balances
+
     def add_asset(self, name, type, amount, interest_rate=0, term_months=0, start_date=None, end_date=None, auto_contribution=0, last_updated_month=None):
         with self._conn() as conn:
             cursor = conn.cursor()
@@ -433,8 +1045,10 @@ class Storage:
                     INSERT INTO assets (name, type, amount, interest_rate, term_months, start_date, end_date, auto_contribution, last_updated_month)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (name, type, amount, interest_rate, term_months, start_date, end_date, auto_contribution, last_updated_month))
+                asset_id = cursor.lastrowid
+                self._log_change(cursor, 'asset', 'add', id=asset_id, assets=True)
                 conn.commit()
-                return cursor.lastrowid
+                return asset_id
             except sqlite3.IntegrityError:
                 return None # Asset name already exists
 
@@ -447,6 +1061,8 @@ class Storage:
                     SET name = ?, type = ?, amount = ?, interest_rate = ?, term_months = ?, start_date = ?, end_date = ?, auto_contribution = ?, last_updated_month = ?
                     WHERE id = ?
                 ''', (name, type, amount, interest_rate, term_months, start_date, end_date, auto_contribution, last_updated_month, asset_id))
+                self._invalidate_asset_snapshots(cursor, asset_id)
+                self._log_change(cursor, 'asset', 'update', id=asset_id, assets=True)
                 conn.commit()
                 return True
             except sqlite3.IntegrityError:
@@ -459,6 +1075,8 @@ class Storage:
             cursor.execute("UPDATE transactions SET asset_id = NULL WHERE asset_id = ?", (asset_id,))
             # Then delete the asset
             cursor.execute("DELETE FROM assets WHERE id = ?", (asset_id,))
+            self._invalidate_asset_snapshots(cursor, asset_id)
+            self._log_change(cursor, 'asset', 'delete', id=asset_id, assets=True)
             conn.commit()
             return True
 
@@ -469,17 +1087,91 @@ class Storage:
                 cursor.execute("UPDATE assets SET amount = ?, last_updated_month = ? WHERE id = ?", (new_amount, last_updated_month, asset_id))
             else:
                 cursor.execute("UPDATE assets SET amount = ? WHERE id = ?", (new_amount, asset_id))
+            self._invalidate_asset_snapshots(cursor, asset_id)
+            self._log_change(cursor, 'asset', 'update_balance', id=asset_id, assets=True)
             conn.commit()
 
     def get_available_months(self):
         """Returns a list of unique months (YYYY-MM) that have transactions"""
         with self._conn() as conn:
             cursor = conn.cursor()
-            # Extract YYYY-MM from date strings like 'YYYY-MM-DD HH:MM:SS'
-            cursor.execute("SELECT DISTINCT substr(date, 1, 7) as month FROM transactions ORDER BY month DESC")
+            # Rollup months are already YYYY-MM and covered by its primary key
+            cursor.execute("SELECT DISTINCT month FROM monthly_category_totals ORDER BY month DESC")
             months = [row['month'] for row in cursor.fetchall() if row['month']]
             return months
 
+    # AI prompt cache
+    def get_ai_cache_entry(self, key, min_created_at, now):
+        """Return the cached JSON response for key (marking it used), or None if missing/expired"""
+        with self._conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE ai_prompt_cache SET last_used = ?, hits = hits + 1 WHERE key = ? AND created_at >= ?",
+                (now, key, min_created_at)
+            )
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return None
+            cursor.execute("SELECT response FROM ai_prompt_cache WHERE key = ?", (key,))
+            row = cursor.fetchone()
+            conn.commit()
+            return row['response'] if row else None
 
+    def put_ai_cache_entry(self, key, response, now):
+        with self._conn() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO ai_prompt_cache (key, response, created_at, last_used, hits)
+                VALUES (?, ?, ?, ?, 0)
+            ''', (key, response, now, now))
+            conn.commit()
 
+    def evict_ai_cache(self, min_created_at, max_entries):
+        """Drop expired entries, then the least recently used beyond max_entries. Returns rows removed."""
+        with self._conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM ai_prompt_cache WHERE created_at < ?", (min_created_at,))
+            removed = cursor.rowcount
+            cursor.execute('''
+                DELETE FROM ai_prompt_cache WHERE key IN (
+                    SELECT key FROM ai_prompt_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            ''', (max_entries,))
+            removed += cursor.rowcount
+            conn.commit()
+            return removed
+
+    def count_ai_cache_entries(self):
+        with self._conn() as conn:
+            return conn.execute("SELECT COUNT(*) FROM ai_prompt_cache").fetchone()[0]
+
+    def backup(self, dest_path, pages=256, sleep=0.005):
+        """
+        Copy a consistent snapshot of the database to dest_path using SQLite's
+        online backup API. Pages are copied in steps of `pages`, sleeping in
+        between, so web/bot writers are never blocked for the whole copy.
+        """
+        source = self._connect()
+        dest = sqlite3.connect(dest_path)
+        try:
+            source.backup(dest, pages=pages, sleep=sleep)
+        finally:
+            dest.close()
+            source.close()
+        return dest_path
 
+    def get_db_settings(self):
+        """Report the active profile and the pragma values SQLite is actually using"""
+        with self._conn() as conn:
+            settings = {}
+            for pragma in ('journal_mode', 'synchronous', 'cache_size', 'mmap_size',
+                           'busy_timeout', 'wal_autocheckpoint', 'page_size', 'page_count'):
+                row = conn.execute(f"PRAGMA {pragma}").fetchone()
+                settings[pragma] = row[0] if row else None
+            return {
+                'db_path': self.db_path,
+                'profile': self.profile_name,
+                'requested': self.pragmas,
+                'active': settings,
+                'pooled_connections': len(self._pool),
+                'last_checkpoint': self._last_checkpoint_result
+            }
@@ -4,20 +4,20 @@ Allows users to record transactions via Telegram messages
 """
 
 import os
+import sys
 import asyncio
 import logging
-import tempfile
 from datetime import datetime
 from telegram import Update, BotCommand
 from telegram.ext import (
     Application,
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
     ContextTypes,
     filters,
 )
 from dotenv import load_dotenv
-from openai import OpenAI
 
 # Load environment variables
 load_dotenv()
@@ -31,17 +31,72 @@ logger = logging.getLogger(__name__)
 
 # Import Money Tracker services
 from .manager import FinanceManager
+from .storage import MONTH_RE
 from .ai_service import AIService
+from .ai_cache import PromptCache
+from .async_runner import BlockingRunner
+from .transcription import get_transcriber
 
-# Initialize services
+# Services used by the handlers, set up by init_services() (build_application()
+# calls it) so that importing this module doesn't open the database
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-manager = FinanceManager(db_path=os.path.join(ROOT_DIR, 'money_tracker.db'))
-ai_service = AIService()
-
-# OpenAI client for Whisper speech-to-text
+manager = None
+ai_service = None
 openai_client = None
-if os.getenv("OPENAI_API_KEY"):
-    openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+transcriber = None
+
+
+def init_services(db_path=None):
+    """
+    Open the database and AI clients. Without db_path this uses
+    money_tracker.db at the project root and does nothing if already done;
+    the load test passes a throwaway database instead.
+    """
+    global manager, ai_service, openai_client, transcriber
+    if manager is not None and db_path is None:
+        return
+    manager = FinanceManager(db_path=db_path or os.path.join(ROOT_DIR, 'money_tracker.db'))
+    ai_service = AIService.instance()
+    ai_service.cache = PromptCache(manager.storage)
+    # OpenAI client for Whisper speech-to-text (shares the AI service's connection pool)
+    openai_client = ai_service.openai_client
+    # Speech-to-text backend (STT_BACKEND)
+    transcriber = get_transcriber(openai_client)
+
+
+# Longest voice note we accept
+VOICE_MAX_DURATION = int(os.getenv("VOICE_MAX_DURATION", "120"))  # seconds
+
+# Handlers are async, but SQLite and the AI clients block. Run them on bounded
+# thread pools so one slow LLM reply doesn't stall every other chat.
+db_runner = BlockingRunner(
+    'bot-db',
+    max_workers=int(os.getenv("BOT_DB_WORKERS", "4")),
+    timeout=float(os.getenv("BOT_DB_TIMEOUT", "10"))
+)
+ai_runner = BlockingRunner(
+    'bot-ai',
+    max_workers=int(os.getenv("BOT_AI_WORKERS", "8")),
+    timeout=float(os.getenv("BOT_AI_TIMEOUT", "60"))
+)
+
+
+async def run_db(func, *args, **kwargs):
+    """Await a blocking FinanceManager read on the database pool (BOT_DB_TIMEOUT applies)"""
+    return await db_runner.run(func, *args, **kwargs)
+
+
+async def run_db_write(func, *args, **kwargs):
+    """
+    Await a FinanceManager write to completion. No timeout: telling the user
+    to retry a write that still commits would record it twice.
+    """
+    return await db_runner.run_to_completion(func, *args, **kwargs)
+
+
+async def run_ai(func, *args, **kwargs):
+    """Await a blocking AI/HTTP call on the AI pool"""
+    return await ai_runner.run(func, *args, **kwargs)
 
 
 def format_vnd(amount: float) -> str:
@@ -109,9 +164,12 @@ async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Check for month argument
     if context.args and len(context.args) > 0:
         current_month = context.args[0]
+        if not MONTH_RE.match(current_month):
+            await safe_reply(update, "📅 Sử dụng: `/month 2026-01`")
+            return
     
-    balance = manager.get_balance(current_month)
-    all_time = manager.get_all_time_stats()
+    balance = await run_db(manager.get_balance, current_month)
+    all_time = await run_db(manager.get_all_time_stats)
     
     month_name = datetime.strptime(current_month, "%Y-%m").strftime("%B %Y")
     
@@ -133,7 +191,7 @@ async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args and len(context.args) > 0:
         current_month = context.args[0]
     
-    report = manager.get_monthly_report(current_month)
+    report = await run_db(manager.get_monthly_report, current_month)
     summary = report['summary']
     spending = report['spending_by_category']
     
@@ -153,7 +211,7 @@ async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def budget_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /budget command - Budget status"""
     current_month = datetime.now().strftime("%Y-%m")
-    status = manager.get_budget_status(current_month)
+    status = await run_db(manager.get_budget_status, current_month)
     
     if not status:
         await safe_reply(update, "📊 Chưa có budget nào được thiết lập.\n\nThử: `set food budget 3m`")
@@ -196,6 +254,79 @@ async def safe_reply(update: Update, text: str, parse_mode='Markdown'):
         logger.error(f"Failed to send message: {e}")
 
 
+async def apply_ai_result(update: Update, text: str, result: dict, unknown_hint: str):
+    """Record the transaction/budget parsed from a message and confirm it to the user"""
+    intent = result.get('intent')
+    
+    if intent == 'transaction':
+        # Add transaction
+        amount = result.get('amount', 0)
+        category = result.get('category', 'Other')
+        tx_type = result.get('type', 'expense')
+        description = result.get('description', text[:50])
+        date = result.get('date')
+        
+        # Get asset_id from payment_source if provided
+        asset_id = None
+        payment_source = result.get('payment_source')
+        if payment_source:
+            assets = await run_db(manager.get_assets)
+            for asset in assets:
+                if asset['type'] == payment_source or asset['name'].lower() == payment_source.lower():
+                    asset_id = asset['id']
+                    break
+        
+        await run_db_write(
+            manager.add_transaction,
+            amount=amount,
+            category=category,
+            type=tx_type,
+            description=description,
+            date=date,
+            asset_id=asset_id
+        )
+        
+        # Emoji based on type
+        emoji = "💸" if tx_type == 'expense' else "💰"
+        type_text = "Chi" if tx_type == 'expense' else "Thu"
+        source_text = f" từ {payment_source}" if payment_source else ""
+        
+        await update.message.reply_text(
+            f"{emoji} *Đã ghi {type_text}:* {format_vnd(amount)}\n"
+            f"📁 Danh mục: {category}\n"
+            f"📝 Mô tả: {description}{source_text}",
+            parse_mode='Markdown'
+        )
+        
+    elif intent == 'budget':
+        # Set/adjust budget
+        category = result.get('category', 'Other')
+        monthly_limit = result.get('monthly_limit', 0)
+        adjustment = result.get('adjustment')
+        month = result.get('month')
+        
+        if adjustment == 'increase':
+            await run_db_write(manager.adjust_budget, category, monthly_limit, month)
+            await update.message.reply_text(
+                f"📈 Đã tăng budget *{category}* thêm {format_vnd(monthly_limit)}",
+                parse_mode='Markdown'
+            )
+        elif adjustment == 'decrease':
+            await run_db_write(manager.adjust_budget, category, -monthly_limit, month)
+            await update.message.reply_text(
+                f"📉 Đã giảm budget *{category}* đi {format_vnd(monthly_limit)}",
+                parse_mode='Markdown'
+            )
+        else:
+            await run_db_write(manager.set_budget, category, monthly_limit, month)
+            await update.message.reply_text(
+                f"✅ Đã đặt budget *{category}*: {format_vnd(monthly_limit)}/tháng",
+                parse_mode='Markdown'
+            )
+    else:
+        await safe_reply(update, f"🤔 Tôi chưa hiểu ý bạn.\n\n{unknown_hint}")
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle natural language messages for transactions and budgets"""
     text = update.message.text
@@ -208,89 +339,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         # Use AI service to parse the message
-        result = ai_service.parse_magic_prompt(text)
+        result = await run_ai(ai_service.parse_magic_prompt, text)
         
         if 'error' in result:
             await safe_reply(update, f"❌ Không hiểu được: _{result['error']}_\n\nThử: `cafe 30k` hoặc `/help`")
             return
         
-        intent = result.get('intent')
-        
-        if intent == 'transaction':
-            # Add transaction
-            amount = result.get('amount', 0)
-            category = result.get('category', 'Other')
-            tx_type = result.get('type', 'expense')
-            description = result.get('description', text[:50])
-            date = result.get('date')
-            
-            # Get asset_id from payment_source if provided
-            asset_id = None
-            payment_source = result.get('payment_source')
-            if payment_source:
-                assets = manager.get_assets()
-                for asset in assets:
-                    if asset['type'] == payment_source or asset['name'].lower() == payment_source.lower():
-                        asset_id = asset['id']
-                        break
-            
-            manager.add_transaction(
-                amount=amount,
-                category=category,
-                type=tx_type,
-                description=description,
-                date=date,
-                asset_id=asset_id
-            )
-            
-            # Emoji based on type
-            emoji = "💸" if tx_type == 'expense' else "💰"
-            type_text = "Chi" if tx_type == 'expense' else "Thu"
-            source_text = f" từ {payment_source}" if payment_source else ""
-            
-            await update.message.reply_text(
-                f"{emoji} *Đã ghi {type_text}:* {format_vnd(amount)}\n"
-                f"📁 Danh mục: {category}\n"
-                f"📝 Mô tả: {description}{source_text}",
-                parse_mode='Markdown'
-            )
-            
-        elif intent == 'budget':
-            # Set/adjust budget
-            category = result.get('category', 'Other')
-            monthly_limit = result.get('monthly_limit', 0)
-            adjustment = result.get('adjustment')
-            month = result.get('month')
-            
-            if adjustment == 'increase':
-                manager.adjust_budget(category, monthly_limit, month)
-                await update.message.reply_text(
-                    f"📈 Đã tăng budget *{category}* thêm {format_vnd(monthly_limit)}",
-                    parse_mode='Markdown'
-                )
-            elif adjustment == 'decrease':
-                manager.adjust_budget(category, -monthly_limit, month)
-                await update.message.reply_text(
-                    f"📉 Đã giảm budget *{category}* đi {format_vnd(monthly_limit)}",
-                    parse_mode='Markdown'
-                )
-            else:
-                manager.set_budget(category, monthly_limit, month)
-                await update.message.reply_text(
-                    f"✅ Đã đặt budget *{category}*: {format_vnd(monthly_limit)}/tháng",
-                    parse_mode='Markdown'
-                )
-        else:
-            await safe_reply(update, "🤔 Tôi chưa hiểu ý bạn.\n\nThử: `cafe 30k` hoặc `/help`")
+        await apply_ai_result(update, text, result, "Thử: `cafe 30k` hoặc `/help`")
             
+    except asyncio.TimeoutError:
+        logger.error("Timed out processing message")
+        await safe_reply(update, "⏱️ Hệ thống đang bận, vui lòng thử lại sau.")
     except Exception as e:
         logger.error(f"Error processing message: {e}")
         await safe_reply(update, f"❌ Có lỗi xảy ra: {str(e)[:100]}")
 
 
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle voice messages - transcribe with Whisper and process"""
-    if not openai_client:
+    """Handle voice messages - transcribe and process"""
+    if not transcriber:
         await safe_reply(update, "❌ Voice input không khả dụng (thiếu OpenAI API key)")
         return
     
@@ -303,30 +370,19 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not voice:
             return
         
-        # Download voice file
-        file = await context.bot.get_file(voice.file_id)
-        
-        # Create temp file
-        with tempfile.NamedTemporaryFile(suffix='.ogg', delete=False) as tmp:
-            tmp_path = tmp.name
+        if voice.duration and voice.duration > VOICE_MAX_DURATION:
+            await safe_reply(update, f"❌ Tin nhắn thoại quá dài (tối đa {VOICE_MAX_DURATION} giây).")
+            return
         
-        # Download to temp file
-        await file.download_to_drive(tmp_path)
+        # Download voice file straight into memory
+        file = await context.bot.get_file(voice.file_id)
+        audio = bytes(await file.download_as_bytearray())
         
-        # Transcribe with Whisper
+        # Transcribe
         await safe_reply(update, "🎤 Đang nhận diện giọng nói...")
         
-        with open(tmp_path, 'rb') as audio_file:
-            transcript = openai_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="vi"  # Vietnamese
-            )
-        
-        # Clean up temp file
-        os.unlink(tmp_path)
-        
-        text = transcript.text.strip()
+        filename = getattr(voice, 'file_name', None) or 'voice.ogg'
+        text = await run_ai(transcriber.transcribe, audio, filename)
         
         if not text:
             await safe_reply(update, "❌ Không nhận diện được giọng nói. Hãy thử lại.")
@@ -336,78 +392,17 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await safe_reply(update, f"🎧 Đã nghe: _{text}_")
         
         # Process the transcribed text using AI service (same as text message)
-        result = ai_service.parse_magic_prompt(text)
+        result = await run_ai(ai_service.parse_magic_prompt, text)
         
         if 'error' in result:
             await safe_reply(update, f"❌ Không hiểu được: _{result['error']}_")
             return
         
-        intent = result.get('intent')
-        
-        if intent == 'transaction':
-            amount = result.get('amount', 0)
-            category = result.get('category', 'Other')
-            tx_type = result.get('type', 'expense')
-            description = result.get('description', text[:50])
-            date = result.get('date')
-            
-            # Get asset_id from payment_source
-            asset_id = None
-            payment_source = result.get('payment_source')
-            if payment_source:
-                assets = manager.get_assets()
-                for asset in assets:
-                    if asset['type'] == payment_source or asset['name'].lower() == payment_source.lower():
-                        asset_id = asset['id']
-                        break
-            
-            manager.add_transaction(
-                amount=amount,
-                category=category,
-                type=tx_type,
-                description=description,
-                date=date,
-                asset_id=asset_id
-            )
-            
-            emoji = "💸" if tx_type == 'expense' else "💰"
-            type_text = "Chi" if tx_type == 'expense' else "Thu"
-            source_text = f" từ {payment_source}" if payment_source else ""
-            
-            await update.message.reply_text(
-                f"{emoji} *Đã ghi {type_text}:* {format_vnd(amount)}\n"
-                f"📁 Danh mục: {category}\n"
-                f"📝 Mô tả: {description}{source_text}",
-                parse_mode='Markdown'
-            )
-            
-        elif intent == 'budget':
-            category = result.get('category', 'Other')
-            monthly_limit = result.get('monthly_limit', 0)
-            adjustment = result.get('adjustment')
-            month = result.get('month')
-            
-            if adjustment == 'increase':
-                manager.adjust_budget(category, monthly_limit, month)
-                await update.message.reply_text(
-                    f"📈 Đã tăng budget *{category}* thêm {format_vnd(monthly_limit)}",
-                    parse_mode='Markdown'
-                )
-            elif adjustment == 'decrease':
-                manager.adjust_budget(category, -monthly_limit, month)
-                await update.message.reply_text(
-                    f"📉 Đã giảm budget *{category}* đi {format_vnd(monthly_limit)}",
-                    parse_mode='Markdown'
-                )
-            else:
-                manager.set_budget(category, monthly_limit, month)
-                await update.message.reply_text(
-                    f"✅ Đã đặt budget *{category}*: {format_vnd(monthly_limit)}/tháng",
-                    parse_mode='Markdown'
-                )
-        else:
-            await safe_reply(update, "🤔 Tôi chưa hiểu ý bạn.\n\nThử nói: \"cà phê ba mươi nghìn\"")
+        await apply_ai_result(update, text, result, "Thử nói: \"cà phê ba mươi nghìn\"")
             
+    except asyncio.TimeoutError:
+        logger.error("Timed out processing voice")
+        await safe_reply(update, "⏱️ Hệ thống đang bận, vui lòng thử lại sau.")
     except Exception as e:
         logger.error(f"Error processing voice: {e}")
         await safe_reply(update, f"❌ Lỗi xử lý voice: {str(e)[:100]}")
@@ -427,18 +422,72 @@ async def post_init(application: Application):
     await application.bot.set_my_commands(commands)
 
 
-def run_bot():
-    """Start the Telegram bot with polling"""
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    
-    if not token:
-        logger.error("TELEGRAM_BOT_TOKEN not found in environment variables!")
-        return
-    
-    logger.info("Starting Money Tracker Telegram Bot...")
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Process updates from different chats concurrently while keeping the
+    updates of any single chat in arrival order (e.g. "cafe 30k" followed by
+    "/balance" must not race).
+
+    BaseUpdateProcessor.process_update takes its semaphore before
+    do_process_update runs, so it would also count updates that are only
+    waiting for their chat: a burst from one chat could fill every slot and
+    stall all other chats. Its semaphore is therefore left unbounded and
+    max_running limits the updates that already hold their chat's lock.
+    """
+
+    def __init__(self, max_running):
+        super().__init__(sys.maxsize)
+        self.max_running = max_running
+        self._running = asyncio.Semaphore(max_running)
+        self._chat_locks = {}  # chat_id -> [asyncio.Lock, users]
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._running:
+                await coroutine
+            return
+        
+        entry = self._chat_locks.setdefault(chat.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, preserving per-chat ordering;
+            # only then does the update take one of the max_running slots
+            async with entry[0]:
+                async with self._running:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chat_locks[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+def build_application(token, concurrent_updates=None, request=None, get_updates_request=None):
+    """
+    Create the bot Application with all handlers registered.
+    concurrent_updates: max updates processed at once (ordered per chat);
+    0 or 1 processes updates sequentially. Defaults to BOT_CONCURRENT_UPDATES.
+    request/get_updates_request: custom telegram.request.BaseRequest objects
+    (used by the load-test harness to avoid the real Telegram API).
+    """
+    init_services()
+    if concurrent_updates is None:
+        concurrent_updates = int(os.getenv("BOT_CONCURRENT_UPDATES", "32"))
     
-    # Create application
-    application = Application.builder().token(token).post_init(post_init).build()
+    builder = Application.builder().token(token).post_init(post_init)
+    if concurrent_updates > 1:
+        builder = builder.concurrent_updates(PerChatUpdateProcessor(concurrent_updates))
+    if request is not None:
+        builder = builder.request(request)
+    if get_updates_request is not None:
+        builder = builder.get_updates_request(get_updates_request)
+    application = builder.build()
     
     # Add handlers
     application.add_handler(CommandHandler("start", start_command))
@@ -455,6 +504,44 @@ def run_bot():
     # Handle voice messages
     application.add_handler(MessageHandler(filters.VOICE | filters.AUDIO, handle_voice))
     
+    return application
+
+
+def run_bot(mode=None):
+    """
+    Start the Telegram bot.
+    mode (or BOT_MODE): "polling" (default) or "webhook". Webhook mode listens on
+    BOT_WEBHOOK_LISTEN:BOT_WEBHOOK_PORT at /BOT_WEBHOOK_PATH, so it can run next to
+    the Flask app behind the same reverse proxy; Telegram is told to call
+    BOT_WEBHOOK_URL. Requires python-telegram-bot[webhooks].
+    """
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    
+    if not token:
+        logger.error("TELEGRAM_BOT_TOKEN not found in environment variables!")
+        return
+    
+    mode = (mode or os.getenv("BOT_MODE", "polling")).lower()
+    logger.info(f"Starting Money Tracker Telegram Bot ({mode})...")
+    
+    application = build_application(token)
+    
+    if mode == "webhook":
+        webhook_url = os.getenv("BOT_WEBHOOK_URL")
+        if not webhook_url:
+            logger.error("BOT_WEBHOOK_URL is required in webhook mode!")
+            return
+        logger.info("Bot is running (webhook)! Press Ctrl+C to stop.")
+        application.run_webhook(
+            listen=os.getenv("BOT_WEBHOOK_LISTEN", "127.0.0.1"),
+            port=int(os.getenv("BOT_WEBHOOK_PORT", "8443")),
+            url_path=os.getenv("BOT_WEBHOOK_PATH", "telegram"),
+            webhook_url=webhook_url,
+            secret_token=os.getenv("BOT_WEBHOOK_SECRET"),
+            allowed_updates=Update.ALL_TYPES
+        )
+        return
+    
     # Start polling
     logger.info("Bot is running! Press Ctrl+C to stop.")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
@@ -0,0 +1,59 @@
+"""
+Speech-to-text backends for voice messages
+Every backend takes the raw audio bytes (no temp files) and returns the text.
+Pick one with STT_BACKEND: "openai" (Whisper API, default), "local"
+(offline faster-whisper model) or "none" to disable voice input.
+"""
+
+import io
+import os
+
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "vi")  # Vietnamese
+
+
+class WhisperAPITranscriber:
+    """OpenAI Whisper API"""
+
+    def __init__(self, client, model="whisper-1", language=STT_LANGUAGE):
+        self.client = client
+        self.model = model
+        self.language = language
+
+    def transcribe(self, audio, filename="voice.ogg"):
+        buffer = io.BytesIO(audio)
+        # The API infers the audio format from the file name
+        buffer.name = filename
+        transcript = self.client.audio.transcriptions.create(
+            model=self.model,
+            file=buffer,
+            language=self.language
+        )
+        return transcript.text.strip()
+
+
+class LocalWhisperTranscriber:
+    """Offline transcription with faster-whisper (pip install faster-whisper)"""
+
+    def __init__(self, model_size=None, language=STT_LANGUAGE, device="auto"):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise RuntimeError("STT_BACKEND=local requires the faster-whisper package") from e
+        self.model = WhisperModel(model_size or os.getenv("STT_LOCAL_MODEL", "small"), device=device)
+        self.language = language
+
+    def transcribe(self, audio, filename="voice.ogg"):
+        segments, _ = self.model.transcribe(io.BytesIO(audio), language=self.language)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+def get_transcriber(openai_client=None, backend=None):
+    """Transcriber selected by STT_BACKEND, or None if voice input is unavailable"""
+    backend = (backend or os.getenv("STT_BACKEND", "openai")).lower()
+    if backend == "none":
+        return None
+    if backend == "local":
+        return LocalWhisperTranscriber()
+    if backend == "openai":
+        return WhisperAPITranscriber(openai_client) if openai_client else None
+    raise ValueError(f"Unknown STT_BACKEND: {backend}")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import the app as the money_tracker package, like run_bot.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+
+from money_tracker.backend.ai_cache import PromptCache
+from money_tracker.backend.storage import Storage
+
+CACHED_ON = datetime(2026, 10, 17, 8, 45)
+LATER = datetime(2026, 11, 20, 9, 0)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PromptCache(Storage(str(tmp_path / 'test.db')))
+
+
+def transaction(date):
+    return {'intent': 'transaction', 'amount': 30000, 'category': 'Food', 'type': 'expense',
+            'description': 'cafe', 'date': date, 'payment_source': None}
+
+
+def budget(month):
+    return {'intent': 'budget', 'category': 'Food', 'monthly_limit': 3000000, 'adjustment': None, 'month': month}
+
+
+def test_relative_answers_follow_the_current_date(cache):
+    cache.put("cafe 30k", 'openai', transaction('2026-10-17T08:45'), now=CACHED_ON)
+    cache.put("budget food 3tr", 'openai', budget('2026-10'), now=CACHED_ON)
+    assert cache.get("cafe 30k", 'openai', now=LATER)['date'] == '2026-11-20T09:00'
+    assert cache.get("budget food 3tr", 'openai', now=LATER)['month'] == '2026-11'
+
+
+def test_explicit_time_is_kept(cache):
+    cache.put("cafe 30k lúc 8h30", 'openai', transaction('2026-10-17T08:30'), now=CACHED_ON)
+    assert cache.get("cafe 30k lúc 8h30", 'openai', now=LATER)['date'] == '2026-11-20T08:30'
+
+
+@pytest.mark.parametrize("text, result", [
+    ("cafe 30k 17/10 lúc 8h30", transaction('2026-10-17T08:30')),
+    ("cafe 30k ngày 17", transaction('2026-10-17T08:45')),
+    ("budget food tháng 10 3tr", budget('2026-10')),
+    ("budget food 10/2026 3tr", budget('2026-10')),
+])
+def test_explicit_dates_are_not_generalized(cache, text, result):
+    cache.put(text, 'openai', result, now=CACHED_ON)
+    assert cache.get(text, 'openai', now=CACHED_ON) == result
+    assert cache.get(text, 'openai', now=LATER) is None
@@ -0,0 +1,51 @@
+import pytest
+
+from money_tracker.backend.ai_router import AIRouter, AIRouterError
+
+
+def pieces(*parts):
+    def stream(prompt, system_prompt):
+        yield from parts
+    return stream
+
+
+def failing(after=()):
+    def stream(prompt, system_prompt):
+        yield from after
+        raise RuntimeError("provider down")
+    return stream
+
+
+def router(**streams):
+    return AIRouter({name: None for name in streams}, preferred=lambda: 'openai', stream_providers=streams)
+
+
+def test_stream_records_success():
+    r = router(openai=pieces('{"a"', ': 1}'), gemini=failing())
+    assert ''.join(r.stream('p', 's')) == '{"a": 1}'
+    assert r.stats['openai'].calls == 1 and r.stats['openai'].failures == 0
+    assert r.stats['gemini'].calls == 0
+
+
+def test_stream_fails_over_before_the_first_piece():
+    r = router(openai=failing(), gemini=pieces('{}'))
+    assert list(r.stream('p', 's')) == ['{}']
+    assert r.stats['openai'].failures == 1
+    assert r.stats['gemini'].calls == 1
+    assert r.counters['failovers'] == 1
+
+
+def test_stream_reraises_after_output():
+    r = router(openai=failing(after=['{"tra']), gemini=pieces('{}'))
+    stream = r.stream('p', 's')
+    assert next(stream) == '{"tra'
+    with pytest.raises(RuntimeError):
+        next(stream)
+    assert r.stats['openai'].failures == 1
+    assert r.stats['gemini'].calls == 0
+
+
+def test_stream_raises_when_every_provider_fails():
+    r = router(openai=failing(), gemini=failing())
+    with pytest.raises(AIRouterError, match='openai: provider down; gemini: provider down'):
+        list(r.stream('p', 's'))
@@ -0,0 +1,40 @@
+import pytest
+
+from money_tracker.backend.manager import FinanceManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = FinanceManager(db_path=str(tmp_path / 'test.db'), query_cache_size=16)
+    manager.add_transaction(30000, 'Food', 'expense', 'cafe', date='2026-10-17 08:30:00')
+    return manager
+
+
+def count_version_checks(manager, monkeypatch):
+    calls = []
+    get_data_version = manager.storage.get_data_version
+    monkeypatch.setattr(manager.storage, 'get_data_version', lambda: calls.append(1) or get_data_version())
+    return calls
+
+
+def test_reads_check_the_data_version_without_a_change_feed(manager, monkeypatch):
+    calls = count_version_checks(manager, monkeypatch)
+    manager.get_balance('2026-10')
+    manager.get_balance('2026-10')
+    assert len(calls) == 2
+
+
+def test_change_feed_hits_are_served_from_memory(manager, monkeypatch):
+    manager.follow_change_feed()
+    assert manager.get_balance('2026-10') == -30000
+    calls = count_version_checks(manager, monkeypatch)
+    assert manager.get_balance('2026-10') == -30000
+    assert calls == []
+    assert manager.cache.stats()['hits'] == 1
+
+
+def test_change_feed_reads_see_local_writes(manager):
+    manager.follow_change_feed()
+    assert manager.get_balance('2026-10') == -30000
+    manager.add_transaction(20000, 'Food', 'expense', 'lunch', date='2026-10-17 12:00:00')
+    assert manager.get_balance('2026-10') == -50000
@@ -0,0 +1,100 @@
+"""
+Golden corpus for the local parser, built from the examples in
+AIService._parse_magic_prompt's prompt. ACCEPTED phrases must resolve locally
+with the LLM's answer; DEFERRED ones must score below the confidence cut-off
+so they still go to the LLM.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from money_tracker.backend.quick_parser import quick_parse, DEFAULT_MIN_CONFIDENCE
+
+NOW = datetime(2026, 10, 17, 9, 0)
+
+ACCEPTED = [
+    ("cafe 30k", {'intent': 'transaction', 'amount': 30000, 'category': 'Food', 'description': 'cafe'}),
+    ("ăn tối 500k tiền mặt", {'intent': 'transaction', 'amount': 500000, 'category': 'Food',
+                             'type': 'expense', 'payment_source': 'Cash'}),
+    ("chuyển khoản 2tr tiền nhà", {'intent': 'transaction', 'amount': 2000000, 'category': 'Rent',
+                                  'type': 'expense', 'payment_source': 'Bank'}),
+    ("giảm 200 ngàn budget shopping", {'intent': 'budget', 'monthly_limit': 200000, 'category': 'Shopping',
+                                      'adjustment': 'decrease', 'month': '2026-10'}),
+    ("ăn sáng 50k", {'intent': 'transaction', 'amount': 50000, 'category': 'Food', 'type': 'expense'}),
+    ("lương 20tr", {'intent': 'transaction', 'amount': 20000000, 'category': 'Salary', 'type': 'income'}),
+    ("set food budget 3m", {'intent': 'budget', 'monthly_limit': 3000000, 'category': 'Food', 'adjustment': None}),
+    ("grab 45k ck", {'intent': 'transaction', 'amount': 45000, 'category': 'Transport', 'payment_source': 'Bank'}),
+    ("tiền nhà 1tr923k", {'intent': 'transaction', 'amount': 1923000, 'category': 'Rent'}),
+    ("tiền nhà 2tr5", {'intent': 'transaction', 'amount': 2500000, 'category': 'Rent'}),
+    ("2 triệu 5 tiền nhà", {'intent': 'transaction', 'amount': 2500000, 'category': 'Rent'}),
+    ("đi chợ 50.000", {'intent': 'transaction', 'amount': 50000, 'category': 'Groceries'}),
+    # Single-syllable keywords only count with their diacritics ("án" is not "ăn")
+    ("nhận tiền dự án 5tr", {'intent': 'transaction', 'amount': 5000000, 'category': 'Other Income',
+                             'type': 'income'}),
+    ("thưởng tết 5tr", {'intent': 'transaction', 'amount': 5000000, 'category': 'Bonus', 'type': 'income'}),
+    # An explicit time of day sets the time, not an amount
+    ("cafe 30k lúc 8h30", {'intent': 'transaction', 'amount': 30000, 'category': 'Food',
+                           'description': 'cafe', 'date': '2026-10-17T08:30'}),
+    ("ăn trưa 40k 12 giờ", {'intent': 'transaction', 'amount': 40000, 'category': 'Food',
+                            'date': '2026-10-17T12:00'}),
+    ("grab 45k 18:15", {'intent': 'transaction', 'amount': 45000, 'date': '2026-10-17T18:15'}),
+]
+
+# Amount rules from the prompt; without a category these still defer to the LLM
+AMOUNTS = [
+    ("35 triệu", 35000000),
+    ("500k", 500000),
+    ("2tr", 2000000),
+    ("1.5tr", 1500000),
+    ("3 tỷ", 3000000000),
+    ("200 nghìn", 200000),
+]
+
+DEFERRED = [
+    # "rưỡi" half-units
+    "3 triệu rưỡi",
+    "500 ngàn rưỡi",
+    "2 tỷ rưỡi",
+    # Budget changes phrased without "budget"
+    "tăng thêm 500k cho food",
+    "giảm food xuống còn 1 triệu",
+    # A bare number next to an amount is not one merged amount
+    "tiền nước tháng 9 300k",
+    "tiền điện tháng 9 500k",
+    "cafe 2 30k",
+    "ăn trưa 40k 2 người",
+    # Dates need real date arithmetic
+    "cafe 30k hôm qua",
+    "ăn trưa 40k 15/10",
+    # Unknown category, including words that only fold into a keyword
+    "35 triệu",
+    "chi phí cá nhân 200k",
+    "quà cho người thương 500k",
+    # Not a readable time
+    "cafe 30k lúc 25h",
+]
+
+
+@pytest.mark.parametrize("text, expected", ACCEPTED)
+def test_accepted(text, expected):
+    result, confidence = quick_parse(text, now=NOW)
+    assert confidence >= DEFAULT_MIN_CONFIDENCE
+    assert {key: result.get(key) for key in expected} == expected
+
+
+@pytest.mark.parametrize("text, amount", AMOUNTS)
+def test_amounts(text, amount):
+    result, _ = quick_parse(text, now=NOW)
+    assert result['amount'] == amount
+
+
+@pytest.mark.parametrize("text", DEFERRED)
+def test_deferred(text):
+    result, confidence = quick_parse(text, now=NOW)
+    assert result is None or confidence < DEFAULT_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("text", ["", "   ", "hello", "cafe"])
+def test_no_amount(text):
+    assert quick_parse(text, now=NOW) == (None, 0.0)
@@ -0,0 +1,85 @@
+"""
+Month filters are written as date ranges so SQLite can use an index
+(`date >= '2026-10' AND date < '2026-11'`, see month_bounds). These tests run
+EXPLAIN QUERY PLAN on the SQL the storage methods actually execute.
+"""
+
+import pytest
+
+from money_tracker.backend.models import Transaction
+from money_tracker.backend.storage import Storage, encode_cursor, month_bounds
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = Storage(str(tmp_path / 'test.db'))
+    asset_id = storage.add_asset('Wallet', 'Cash', 1000000)
+    storage.add_transactions_bulk([
+        Transaction(amount=1000 * i, category='Food', type='expense', description=f'tx {i}',
+                    date=f'2026-{i % 12 + 1:02d}-10T12:00', asset_id=asset_id if i % 2 else None)
+        for i in range(1, 50)
+    ])
+    return storage
+
+
+def transaction_plans(storage, monkeypatch, call):
+    """EXPLAIN QUERY PLAN of every SELECT on transactions that call() runs"""
+    statements = []
+    # iter_transactions opens its own connection, everything else uses the pooled one
+    connect = storage._connect
+
+    def traced_connect():
+        conn = connect()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(storage, '_connect', traced_connect)
+    with storage._conn() as conn:
+        conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        with storage._conn() as conn:
+            conn.set_trace_callback(None)
+
+    with storage._conn() as conn:
+        plans = [
+            ' | '.join(row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql))
+            for sql in statements
+            if sql.lstrip().upper().startswith('SELECT') and 'FROM transactions' in sql
+        ]
+    assert plans, "no transaction query was executed"
+    return plans
+
+
+RANGE_QUERIES = {
+    'transactions_by_month': lambda s: s.get_transactions_by_month('2026-10'),
+    'page_by_month': lambda s: s.get_transactions_page(limit=10, month='2026-10'),
+    'page_after_cursor': lambda s: s.get_transactions_page(limit=10, cursor=encode_cursor('2026-06-10T12:00', 25)),
+    'export_by_month': lambda s: list(s.iter_transactions(month='2026-10')),
+    'export_by_dates': lambda s: list(s.iter_transactions(start_date='2026-03-01', end_date='2026-05-31')),
+    'asset_adjustment_after': lambda s: s.get_asset_balance_adjustment_after(1, '2026-10'),
+    'asset_adjustments_after': lambda s: s.get_asset_adjustments_after('2026-10'),
+}
+
+
+@pytest.mark.parametrize('name', sorted(RANGE_QUERIES))
+def test_range_queries_search_an_index(storage, monkeypatch, name):
+    for plan in transaction_plans(storage, monkeypatch, lambda: RANGE_QUERIES[name](storage)):
+        assert 'SEARCH transactions USING' in plan and 'INDEX' in plan, plan
+        assert 'SCAN transactions' not in plan, plan
+
+
+def test_asset_adjustments_after_ranges_on_date(storage, monkeypatch):
+    plans = transaction_plans(storage, monkeypatch, lambda: storage.get_asset_adjustments_after('2026-10'))
+    assert all('idx_transactions_date (date>?)' in plan for plan in plans), plans
+
+
+@pytest.mark.parametrize('month', ['garbage', '2026-13', '2026-1', '2026-10-05', '', None])
+def test_month_bounds_rejects_malformed_months(month):
+    with pytest.raises(ValueError, match='Invalid month'):
+        month_bounds(month)
+
+
+def test_month_bounds_wraps_the_year():
+    assert month_bounds('2026-12') == ('2026-12', '2027-01')
@@ -1,11 +1,18 @@
-from flask import Flask, render_template, request, jsonify, Response
-from flask_socketio import SocketIO, emit
+from flask import Flask, render_template, request, jsonify, Response, make_response
+from flask_socketio import SocketIO, emit, join_room, leave_room
+import click
 import csv
+import functools
+import hashlib
 import io
+import zlib
 from money_tracker.backend.manager import FinanceManager
+from money_tracker.backend import backup
+from money_tracker.backend.change_feed import start_change_feed
 import os
 import subprocess
 import json
+import threading
 from datetime import datetime
 import sys
 
@@ -22,6 +29,109 @@ else:
 
 manager = FinanceManager(db_path=os.path.join(root_dir, 'money_tracker.db'))
 
+# Optional rotated snapshots (MONEY_TRACKER_BACKUP_INTERVAL_HOURS). With several
+# gunicorn workers, enable this in only one process.
+backup_scheduler = backup.start_scheduled_backups(manager.storage, os.path.join(root_dir, 'backups'))
+
+# Month each Socket.IO client is looking at (sid -> YYYY-MM); clients join room month:<YYYY-MM>
+viewed_months = {}
+# Socket.IO handlers and the change feed thread both use viewed_months
+viewed_months_lock = threading.Lock()
+
+def month_room(month):
+    return f"month:{month}"
+
+@socketio.on('view_month')
+def on_view_month(data):
+    month = (data or {}).get('month') or datetime.now().strftime("%Y-%m")
+    try:
+        datetime.strptime(month, "%Y-%m")
+    except (TypeError, ValueError):
+        return
+    with viewed_months_lock:
+        old = viewed_months.get(request.sid)
+        viewed_months[request.sid] = month
+    if old and old != month:
+        leave_room(month_room(old))
+    join_room(month_room(month))
+
+@socketio.on('disconnect')
+def on_disconnect(*args):
+    with viewed_months_lock:
+        viewed_months.pop(request.sid, None)
+
+def month_delta(change, month):
+    """
+    data_updated payload for clients viewing month, or None if the change
+    doesn't affect what they see. Carries the changed transaction and the
+    recomputed aggregates (served from the query cache), so the client can
+    patch its state without refetching. delta=False asks for a full refetch.
+    """
+    months = change.get('months') or []
+    asset_month = change.get('asset_month')
+    in_month = month in months
+    touches_assets = change.get('assets') or (asset_month is not None and asset_month <= month)
+    touches_budget = in_month or change.get('budget_month') == month
+    if change['type'] != 'transaction' and not (touches_budget or touches_assets):
+        return None
+
+    payload = {'type': change['type'], 'action': change['action'], 'month': month, 'delta': True}
+    if change['type'] == 'transaction':
+        if change['action'] == 'bulk_add' and in_month:
+            # Too many rows to patch in; let the client reload the month
+            payload.update(delta=False, count=change.get('count'))
+            return payload
+        payload['all_time'] = manager.get_all_time_stats()
+        payload['available_months'] = manager.get_available_months()
+        if in_month:
+            payload['balance'] = manager.get_balance(month)
+        if change.get('id') is not None:
+            transaction = manager.storage.get_transaction(change['id'])
+            if transaction and transaction.date[:7] == month:
+                payload['transaction'] = vars(transaction)
+            elif in_month:
+                # Deleted, or moved to another month
+                payload['removed_id'] = change['id']
+    if touches_budget:
+        payload['budget_status'] = manager.get_budget_status(month)
+    if touches_assets:
+        payload['assets'] = manager.get_assets(month)
+    return payload
+
+def on_database_changes(changes, complete):
+    """
+    Called by the change feed for every batch of committed writes, from this
+    process or others (other gunicorn workers, the Telegram bot). Refreshes
+    this worker's query cache and sends each month room a delta event.
+    """
+    manager.sync_cache()
+    if not complete or any(change.get('reset') for change in changes):
+        socketio.emit('data_updated', {'type': 'sync', 'action': 'reload'})
+        return
+    pid = os.getpid()
+    with viewed_months_lock:
+        months = set(viewed_months.values())
+    for change in changes:
+        source = 'local' if change['pid'] == pid else 'external'
+        if change['type'] == 'diary':
+            socketio.emit('data_updated', {'type': 'diary', 'action': change['action'], 'date': change.get('date'), 'source': source})
+            continue
+        for month in months:
+            payload = month_delta(change, month)
+            if payload:
+                payload['source'] = source
+                socketio.emit('data_updated', payload, to=month_room(month))
+
+def notify_clients(event):
+    """Plain data_updated broadcast, only needed when the change feed is disabled"""
+    if change_feed is None:
+        socketio.emit('data_updated', event)
+
+# Watch for committed writes, ours and other processes' (MONEY_TRACKER_CHANGE_POLL_MS=0 to disable)
+change_feed = start_change_feed(manager.storage, on_database_changes, socketio.start_background_task)
+if change_feed is not None:
+    manager.follow_change_feed()
+
 # Cache for recurring contribution check to prevent race condition
 _last_contribution_check = None
 
@@ -36,6 +146,47 @@ def check_and_process_contributions():
         manager.check_recurring_contributions(current_month)
         _last_contribution_check = current_date
 
+def conditional_get(prepare=None, vary=None):
+    """
+    ETag support for read-only JSON views. The tag combines the storage data
+    version (bumped by every write), the full request path and today's date
+    (default months and recurring contributions depend on it), so a matching
+    If-None-Match is answered with 304 before the view runs any query.
+    prepare() runs first, for views that may write before reading.
+    vary() adds state that isn't in the database (e.g. the active AI provider).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if prepare:
+                prepare()
+            key = f"{manager.storage.get_data_version()}|{request.full_path}|{datetime.now().strftime('%Y-%m-%d')}"
+            if vary:
+                key += f"|{vary()}"
+            etag = hashlib.sha1(key.encode()).hexdigest()[:20]
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Cache, but always revalidate
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def get_ai_service():
+    """Process-wide AIService, so HTTP connections are reused across requests"""
+    # Imported lazily: the AI SDKs are slow to load and only needed on AI routes
+    from money_tracker.backend.ai_service import AIService
+    from money_tracker.backend.ai_cache import PromptCache
+    ai_service = AIService.instance()
+    if ai_service.cache is None:
+        ai_service.cache = PromptCache(manager.storage)
+    return ai_service
+
 @app.route('/')
 def index():
     # User request: "Total Balance" should show only specific month usage (Net Income)
@@ -57,53 +208,90 @@ def reports():
     return render_template('reports.html')
 
 
+VALID_CATEGORIES = ['Food', 'Rent', 'Utilities', 'Transport', 'Groceries', 'Shopping', 
+                    'Entertainment', 'Travel', 'Health', 'Salary', 'Bonus', 'Investment', 
+                    'Other Income', 'Other', 'Savings']
+
+# Upper bound for a single /api/transactions/bulk request
+MAX_BULK_TRANSACTIONS = 5000
+
+# Accepted transaction dates: <input type="date">, datetime-local and the stored form
+TRANSACTION_DATE_FORMATS = ['%Y-%m-%d', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S',
+                            '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S']
+
+def is_valid_transaction_date(value):
+    """True if value is a YYYY-MM-DD[ HH:MM[:SS]] string (a 'T' separator is fine too)"""
+    if not isinstance(value, str):
+        return False
+    for fmt in TRANSACTION_DATE_FORMATS:
+        try:
+            datetime.strptime(value, fmt)
+            return True
+        except ValueError:
+            continue
+    return False
+
+def validate_transaction_payload(data):
+    """
+    Validate a new-transaction payload (as sent to /add).
+    Returns (fields, None) on success or (None, error_message).
+    Raises ValueError if amount is not a number.
+    """
+    # Validate required fields
+    if not data.get('amount') or not data.get('category') or not data.get('type'):
+        return None, 'Missing required fields'
+    
+    # Validate amount
+    amount = float(data['amount'])
+    if amount <= 0:
+        return None, 'Amount must be greater than 0'
+    
+    # Validate type
+    tx_type = data['type']
+    if tx_type not in ['income', 'expense']:
+        return None, 'Type must be "income" or "expense"'
+    
+    # Validate category
+    category = data['category']
+    if category not in VALID_CATEGORIES:
+        return None, f'Invalid category: {category}'
+    
+    # Validate asset_id if provided
+    asset_id = data.get('asset_id')
+    if asset_id is not None and asset_id != '':
+        try:
+            asset_id = int(asset_id)
+        except (ValueError, TypeError):
+            return None, 'Invalid asset_id'
+    else:
+        asset_id = None
+    
+    # Validate date if provided (it feeds the month rollups and the month selector)
+    date = data.get('date')
+    if date and not is_valid_transaction_date(date):
+        return None, f'Invalid date: {date}'
+    
+    return {
+        'amount': amount,
+        'category': category,
+        'type': tx_type,
+        'description': data.get('description', ''),
+        'date': date or None,
+        'asset_id': asset_id
+    }, None
+
 @app.route('/add', methods=['POST'])
 def add_transaction():
     data = request.json
     
     # Input validation
     try:
-        # Validate required fields
-        if not data.get('amount') or not data.get('category') or not data.get('type'):
-            return jsonify({'success': False, 'error': 'Missing required fields'}), 400
-        
-        # Validate amount
-        amount = float(data['amount'])
-        if amount <= 0:
-            return jsonify({'success': False, 'error': 'Amount must be greater than 0'}), 400
-        
-        # Validate type
-        tx_type = data['type']
-        if tx_type not in ['income', 'expense']:
-            return jsonify({'success': False, 'error': 'Type must be "income" or "expense"'}), 400
-        
-        # Validate category
-        valid_categories = ['Food', 'Rent', 'Utilities', 'Transport', 'Groceries', 'Shopping', 
-                          'Entertainment', 'Travel', 'Health', 'Salary', 'Bonus', 'Investment', 
-                          'Other Income', 'Other', 'Savings']
-        category = data['category']
-        if category not in valid_categories:
-            return jsonify({'success': False, 'error': f'Invalid category: {category}'}), 400
-        
-        # Validate asset_id if provided
-        asset_id = data.get('asset_id')
-        if asset_id is not None and asset_id != '':
-            try:
-                asset_id = int(asset_id)
-            except (ValueError, TypeError):
-                return jsonify({'success': False, 'error': 'Invalid asset_id'}), 400
-        else:
-            asset_id = None
+        fields, error = validate_transaction_payload(data)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
         
-        manager.add_transaction(
-            amount=amount,
-            category=category,
-            type=tx_type,
-            description=data.get('description', ''),
-            date=data.get('date'),
-            asset_id=asset_id
-        )
-        socketio.emit('data_updated', {'type': 'transaction', 'action': 'add'})
+        manager.add_transaction(**fields)
+        notify_clients({'type': 'transaction', 'action': 'add'})
         return jsonify({'success': True}), 201
         
     except ValueError as e:
@@ -114,11 +302,42 @@ def add_transaction():
         print(f"Unexpected error in add_transaction: {type(e).__name__}: {e}")
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
+@app.route('/api/transactions/bulk', methods=['POST'])
+def add_transactions_bulk():
+    """Save many transactions in one commit. Invalid items are skipped and reported."""
+    data = request.json or {}
+    items = data.get('transactions')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'No transactions provided'}), 400
+    if len(items) > MAX_BULK_TRANSACTIONS:
+        return jsonify({'success': False, 'error': f'Too many transactions (max {MAX_BULK_TRANSACTIONS})'}), 400
+    
+    valid = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            fields, error = validate_transaction_payload(item if isinstance(item, dict) else {})
+        except (ValueError, TypeError) as e:
+            fields, error = None, f'Invalid data type: {str(e)}'
+        if error:
+            errors.append({'index': index, 'error': error})
+        else:
+            valid.append(fields)
+    
+    try:
+        if valid:
+            manager.add_transactions_bulk(valid)
+            notify_clients({'type': 'transaction', 'action': 'bulk_add', 'count': len(valid)})
+        return jsonify({'success': bool(valid), 'inserted': len(valid), 'errors': errors}), 201 if valid else 400
+    except Exception as e:
+        print(f"Unexpected error in add_transactions_bulk: {type(e).__name__}: {e}")
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
 @app.route('/delete/<int:transaction_id>', methods=['DELETE'])
 def delete_transaction(transaction_id):
     try:
         manager.delete_transaction(transaction_id)
-        socketio.emit('data_updated', {'type': 'transaction', 'action': 'delete'})
+        notify_clients({'type': 'transaction', 'action': 'delete'})
         return jsonify({'success': True})
     except ValueError as e:
         return jsonify({'success': False, 'error': str(e)}), 404
@@ -147,13 +366,14 @@ def update_transaction(transaction_id):
             return jsonify({'success': False, 'error': 'Type must be "income" or "expense"'}), 400
         
         # Validate category
-        valid_categories = ['Food', 'Rent', 'Utilities', 'Transport', 'Groceries', 'Shopping', 
-                          'Entertainment', 'Travel', 'Health', 'Salary', 'Bonus', 'Investment', 
-                          'Other Income', 'Other', 'Savings']
         category = data['category']
-        if category not in valid_categories:
+        if category not in VALID_CATEGORIES:
             return jsonify({'success': False, 'error': f'Invalid category: {category}'}), 400
         
+        # Validate date
+        if not is_valid_transaction_date(data['date']):
+            return jsonify({'success': False, 'error': f"Invalid date: {data['date']}"}), 400
+        
         manager.update_transaction(
             transaction_id=transaction_id,
             amount=amount,
@@ -162,7 +382,7 @@ def update_transaction(transaction_id):
             description=data.get('description', ''),
             date=data['date']
         )
-        socketio.emit('data_updated', {'type': 'transaction', 'action': 'update'})
+        notify_clients({'type': 'transaction', 'action': 'update'})
         return jsonify({'success': True})
         
     except ValueError as e:
@@ -174,18 +394,20 @@ def update_transaction(transaction_id):
         return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 @app.route('/api/data')
+# Auto-process recurring savings (cached to run only once per day) before the version is read
+@conditional_get(prepare=check_and_process_contributions)
 def get_data():
     # Use standard month if not provided
     month = request.args.get('month') # Format: YYYY-MM
     current_month = datetime.now().strftime("%Y-%m")
     effective_month = month if month else current_month
     
-    # Auto-process recurring savings (cached to run only once per day)
-    check_and_process_contributions()
-    
     # Return data for selected month
-    balance = manager.get_balance(effective_month)
-    transactions = manager.get_recent_transactions(effective_month)
+    try:
+        balance = manager.get_balance(effective_month)
+        transactions = manager.get_recent_transactions(effective_month)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     all_time = manager.get_all_time_stats()
     return jsonify({
         'balance': balance,
@@ -193,17 +415,105 @@ def get_data():
         'all_time': all_time
     })
 
+def dashboard_ai_provider():
+    """ETag component for /api/dashboard?ai=1, which includes the active model"""
+    if request.args.get('ai') != '1':
+        return ''
+    try:
+        return get_ai_service().get_active_provider()
+    except Exception:
+        return ''
+
+@app.route('/api/dashboard')
+@conditional_get(prepare=check_and_process_contributions, vary=dashboard_ai_provider)
+def get_dashboard():
+    """
+    Everything the dashboard shows for one month in a single request: the
+    /api/data view plus assets, budget status and available months, and the
+    /api/ai-info badge with ?ai=1 (first load only). Recurring contributions
+    are checked once and the aggregates come from the query cache.
+    """
+    month = request.args.get('month') or datetime.now().strftime("%Y-%m")
+    try:
+        payload = {
+            'month': month,
+            'balance': manager.get_balance(month),
+            # wallet isn't stored, so leave it out of every row
+            'transactions': [{key: value for key, value in vars(t).items() if key != 'wallet'}
+                             for t in manager.get_recent_transactions(month)],
+            'all_time': manager.get_all_time_stats(),
+            'assets': manager.get_assets(month),
+            'budget_status': manager.get_budget_status(month),
+            'available_months': manager.get_available_months(),
+        }
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if request.args.get('ai') == '1':
+        try:
+            payload['ai'] = get_ai_service().get_model_info()
+        except Exception as e:
+            payload['ai'] = {'error': str(e)}
+    return jsonify(payload)
+
+# Page size bounds for /api/transactions
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+@app.route('/api/transactions')
+def list_transactions():
+    """Cursor-paginated transaction list: ?limit=&cursor=&month=YYYY-MM"""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
+    try:
+        transactions, next_cursor = manager.get_transactions_page(
+            limit=limit,
+            cursor=request.args.get('cursor') or None,
+            month=request.args.get('month') or None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'transactions': [vars(t) for t in transactions],
+        'next_cursor': next_cursor
+    })
+
 @app.route('/api/available-months')
+@conditional_get()
 def get_available_months():
     months = manager.get_available_months()
     return jsonify(months)
 
 @app.route('/export')
 def export_data():
-    transactions = manager.get_recent_transactions()
+    """
+    Stream transactions as CSV straight from the database cursor.
+    Optional filters: ?month=YYYY-MM, ?from=YYYY-MM-DD, ?to=YYYY-MM-DD, ?category=
+    Add ?gzip=1 for a gzip-compressed download.
+    """
+    month = request.args.get('month') or None
+    start_date = request.args.get('from') or None
+    end_date = request.args.get('to') or None
+    category = request.args.get('category') or None
+    use_gzip = request.args.get('gzip') in ('1', 'true', 'yes')
+    
+    rows = manager.iter_transactions(month, start_date, end_date, category)
+    try:
+        # Run the query now so bad filters fail with 400 instead of a broken download
+        first_chunk = next(rows, [])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Generate CSV
-    def generate():
+    def generate_csv():
         # Excel needs BOM to recognize UTF-8
         yield '\ufeff'
         
@@ -216,23 +526,40 @@ def export_data():
         data.seek(0)
         data.truncate(0)
         
-        # Rows
-        for t in transactions:
-            w.writerow((
-                t.id,
-                f"\t{t.date}", # Prepend tab to force text display in Excel (prevents #######)
-                t.category,
-                t.type,
-                t.amount,
-                t.description or '' 
-            ))
-            yield data.getvalue()
-            data.seek(0)
-            data.truncate(0)
+        # Rows, one batch per fetched chunk
+        try:
+            chunk = first_chunk
+            while chunk:
+                w.writerows((
+                    row['id'],
+                    f"\t{row['date']}", # Prepend tab to force text display in Excel (prevents #######)
+                    row['category'],
+                    row['type'],
+                    row['amount'],
+                    row['description'] or ''
+                ) for row in chunk)
+                yield data.getvalue()
+                data.seek(0)
+                data.truncate(0)
+                chunk = next(rows, None)
+        finally:
+            rows.close() # releases the export connection if the client disconnects
+    
+    def generate_gzip():
+        compressor = zlib.compressobj(wbits=31) # 31 = gzip container
+        for text in generate_csv():
+            compressed = compressor.compress(text.encode('utf-8'))
+            if compressed:
+                yield compressed
+        yield compressor.flush()
 
     # Return as stream
-    response = Response(generate(), mimetype='text/csv')
-    response.headers.set("Content-Disposition", "attachment", filename="transactions.csv")
+    if use_gzip:
+        response = Response(generate_gzip(), mimetype='application/gzip')
+        response.headers.set("Content-Disposition", "attachment", filename="transactions.csv.gz")
+    else:
+        response = Response(generate_csv(), mimetype='text/csv')
+        response.headers.set("Content-Disposition", "attachment", filename="transactions.csv")
     return response
 
 @app.route('/api/magic-assistant', methods=['POST'])
@@ -243,8 +570,7 @@ def magic_assistant():
         return jsonify({'error': 'No text provided'}), 400
     
     try:
-        from money_tracker.backend.ai_service import AIService
-        ai_service = AIService()
+        ai_service = get_ai_service()
         result = ai_service.parse_magic_prompt(text)
         return jsonify(result)
     except Exception as e:
@@ -258,8 +584,7 @@ def ai_parse():
         return jsonify({'error': 'No text provided'}), 400
     
     try:
-        from money_tracker.backend.ai_service import AIService
-        ai_service = AIService()
+        ai_service = get_ai_service()
         result = ai_service.parse_transaction(text) # Uses backward compatibility method
         return jsonify(result)
     except Exception as e:
@@ -273,14 +598,66 @@ def ai_bulk_extract():
         return jsonify({'error': 'No text provided'}), 400
     
     try:
-        from money_tracker.backend.ai_service import AIService
-        ai_service = AIService()
+        ai_service = get_ai_service()
         result = ai_service.extract_bulk_transactions(text)
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
+@app.route('/api/ai/bulk-extract/stream', methods=['POST'])
+def ai_bulk_extract_stream():
+    """
+    Server-sent events, each transaction as soon as it parses out of the model's reply:
+    "transaction" {chunk, transaction}, "chunk" {chunk, chunks, error}, then "done" {count}
+    """
+    data = request.json
+    text = data.get('text') if data else None
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+
+    try:
+        events = get_ai_service().stream_bulk_transactions(text)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    def generate():
+        count = 0
+        try:
+            for event in events:
+                kind = event.pop('event')
+                if kind == 'transaction':
+                    count += 1
+                yield sse_message(kind, event)
+            yield sse_message('done', {'count': count})
+        except Exception as e:
+            yield sse_message('done', {'count': count, 'error': str(e)})
+        finally:
+            # Client went away: stop chunks that have not started
+            events.close()
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+
+@app.route('/api/ai/cache-stats')
+def get_ai_cache_stats():
+    try:
+        return jsonify(get_ai_service().cache.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ai/router-stats')
+def get_ai_router_stats():
+    try:
+        return jsonify(get_ai_service().router.get_stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/switch-model', methods=['POST'])
 def switch_model():
@@ -298,8 +675,7 @@ def switch_model():
 @app.route('/api/ai-info')
 def get_ai_info():
     try:
-        from money_tracker.backend.ai_service import AIService
-        ai_service = AIService()
+        ai_service = get_ai_service()
         return jsonify(ai_service.get_model_info())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -324,7 +700,7 @@ def set_budget():
                 monthly_limit=amount,
                 month=month
             )
-        socketio.emit('data_updated', {'type': 'budget', 'action': 'set'})
+        notify_clients({'type': 'budget', 'action': 'set'})
         return jsonify({'success': True}), 201
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -343,27 +719,33 @@ def delete_budget(category):
     try:
         month = request.args.get('month')
         manager.delete_budget(category, month)
-        socketio.emit('data_updated', {'type': 'budget', 'action': 'delete'})
+        notify_clients({'type': 'budget', 'action': 'delete'})
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/budget-status')
+@conditional_get()
 def get_budget_status():
     try:
         month = request.args.get('month')
         status = manager.get_budget_status(month)
         return jsonify(status)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Report endpoints
 @app.route('/api/monthly-report')
+@conditional_get()
 def get_monthly_report():
     try:
         month = request.args.get('month')
         report = manager.get_monthly_report(month)
         return jsonify(report)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -389,7 +771,7 @@ def save_diary():
         if not date:
             return jsonify({'error': 'No date provided'}), 400
         manager.save_diary(date, content, title)
-        socketio.emit('data_updated', {'type': 'diary', 'date': date})
+        notify_clients({'type': 'diary', 'date': date})
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -403,11 +785,14 @@ def get_diary_history():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/assets', methods=['GET'])
+@conditional_get()
 def get_assets():
     try:
         month = request.args.get('month')
         assets = manager.get_assets(month)
         return jsonify(assets)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -415,12 +800,12 @@ def get_assets():
 @app.route('/api/assets', methods=['GET', 'POST'])
 def handle_assets():
     if request.method == 'GET':
-        return jsonify(manager.storage.get_assets())
+        return jsonify(manager.get_assets())
     
     # POST - Create new asset
     data = request.json
     try:
-        new_id = manager.storage.add_asset(
+        new_id = manager.add_asset(
             name=data['name'],
             type=data['type'],
             amount=data.get('amount', 0),
@@ -441,13 +826,13 @@ def handle_assets():
 @app.route('/api/assets/<int:asset_id>', methods=['PUT', 'DELETE'])
 def handle_asset_item(asset_id):
     if request.method == 'DELETE':
-        success = manager.storage.delete_asset(asset_id)
+        success = manager.delete_asset(asset_id)
         return jsonify({'success': success})
     
     # PUT - Update asset
     data = request.json
     try:
-        success = manager.storage.update_asset(
+        success = manager.update_asset(
             asset_id=asset_id,
             name=data['name'],
             type=data['type'],
@@ -468,18 +853,38 @@ def handle_asset_item(asset_id):
         
 @app.route('/api/backup')
 def backup_database():
+    snapshot_path = None
     try:
-        db_path = os.path.join(root_dir, 'money_tracker.db')
-        with open(db_path, 'rb') as f:
-            data = f.read()
-        return Response(
-            data,
+        # Consistent online snapshot, streamed from a temp file that is removed afterwards
+        snapshot_path = backup.snapshot_to_tempfile(manager.storage)
+        response = Response(
+            backup.iter_file(snapshot_path),
             mimetype="application/x-sqlite3",
-            headers={"Content-disposition": "attachment; filename=money_tracker_backup.db"}
+            headers={
+                "Content-disposition": "attachment; filename=money_tracker_backup.db",
+                "Content-Length": str(os.path.getsize(snapshot_path))
+            }
         )
+        # Also covers a body that is never iterated (HEAD, client gone before the first chunk)
+        response.call_on_close(lambda: backup.discard(snapshot_path))
+        return response
     except Exception as e:
+        if snapshot_path:
+            backup.discard(snapshot_path)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/diagnostics/db')
+def db_diagnostics():
+    try:
+        return jsonify(manager.storage.get_db_settings())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/diagnostics/cache')
+def cache_diagnostics():
+    """Hit rate and size of this worker's FinanceManager query cache"""
+    return jsonify(manager.cache.stats())
+
 @app.route('/ag-quota')
 def ag_quota_dashboard():
     return render_template('ag_quota.html')
@@ -561,5 +966,20 @@ def add_account():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.cli.command('rollups')
+@click.argument('action', type=click.Choice(['verify', 'rebuild']))
+def rollups_command(action):
+    """Verify or rebuild the monthly_category_totals rollup table."""
+    if action == 'rebuild':
+        manager.storage.rebuild_rollups()
+        click.echo("Rollup rebuilt from transactions.")
+    mismatches = manager.storage.verify_rollups()
+    if not mismatches:
+        click.echo("Rollup is in sync with transactions.")
+        return
+    for m in mismatches:
+        click.echo(f"{m['month']} {m['category']} ({m['type']}): expected {m['expected']}, got {m['actual']}")
+    raise SystemExit(1)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -14,11 +14,15 @@ document.addEventListener('DOMContentLoaded', () => {
                 loadDiary(data.date);
             }
             loadDiaryHistory();
-        } else {
+        } else if (!applyDelta(data)) {
             const selectedMonth = EL.monthSelector ? EL.monthSelector.value : null;
             fetchData(selectedMonth);
         }
     });
+    socket.on('connect', () => {
+        // Rejoin our month room after a reconnect
+        if (dashboard) socket.emit('view_month', { month: dashboard.month });
+    });
 
     // --- Cached DOM Elements (js-cache-property-access inspired) ---
     const EL = {
@@ -198,19 +202,24 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!EL.aiModelBadge) return;
         try {
             const response = await fetch('/api/ai-info');
-            const data = await response.json();
-            if (data.provider && data.model) {
-                EL.aiModelBadge.textContent = `${data.provider} (${data.model})`;
-                if (EL.modelSelector) EL.modelSelector.value = data.provider.toLowerCase();
-            } else {
-                EL.aiModelBadge.textContent = 'AI Ready';
-            }
+            renderAIInfo(await response.json());
         } catch (error) {
             console.error('Error fetching AI info:', error);
             EL.aiModelBadge.textContent = 'AI Offline';
         }
     }
-    fetchAIInfo();
+
+    function renderAIInfo(data) {
+        if (!EL.aiModelBadge) return;
+        if (data.provider && data.model) {
+            EL.aiModelBadge.textContent = `${data.provider} (${data.model})`;
+            if (EL.modelSelector) EL.modelSelector.value = data.provider.toLowerCase();
+        } else {
+            EL.aiModelBadge.textContent = 'AI Ready';
+        }
+    }
+    // Loaded with the dashboard (fetchData withAI) when the month selector is present
+    if (!EL.monthSelector) fetchAIInfo();
 
     // Model Selector Change Logic
     EL.modelSelector?.addEventListener('change', async (e) => {
@@ -736,142 +745,192 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     // ========== MAIN DATA FETCHING ==========
-    async function fetchData(month = null) {
+    // Last rendered /api/dashboard view, patched in place by applyDelta()
+    let dashboard = null;
+
+    // One /api/dashboard request per view; withAI also fills the model badge (first load)
+    async function fetchData(month = null, { withAI = false } = {}) {
         // If no month provided, use current month as default
         const currentMonth = new Date().toISOString().substring(0, 7);
         const effectiveMonth = month || currentMonth;
 
+        // Receive data_updated deltas for this month
+        socket.emit('view_month', { month: effectiveMonth });
+
         console.log(`Fetching data for month: ${effectiveMonth}...`);
         try {
-            const url = `/api/data?month=${effectiveMonth}`;
+            const url = `/api/dashboard?month=${effectiveMonth}${withAI ? '&ai=1' : ''}`;
             const response = await fetch(url);
             const data = await response.json();
 
-            if (!data) return;
+            if (!data || data.error) return;
 
-            // Fetch assets for the selected month
-            fetchAssets(effectiveMonth);
+            renderData(data, effectiveMonth);
+            renderAssets(data.assets);
+            renderBudgetStatus(data.budget_status);
+            if (data.ai) renderAIInfo(data.ai);
+            return data;
+        } catch (error) {
+            console.error('Error in fetchData:', error);
+        }
+    }
 
-            // Update balance
-            if (EL.balanceAmount) {
-                EL.balanceAmount.textContent = `${(data.balance || 0).toLocaleString('vi-VN')} ₫`;
-            }
+    function renderData(data, month) {
+        dashboard = {
+            month: month,
+            balance: data.balance,
+            all_time: data.all_time,
+            transactions: Array.isArray(data.transactions) ? data.transactions : []
+        };
 
-            // Update All-Time Stats in Sidebar
-            if (data.all_time) {
-                if (EL.totalIncomeStat) EL.totalIncomeStat.textContent = `${Number(data.all_time.income || 0).toLocaleString('vi-VN')} ₫`;
-                if (EL.totalExpenseStat) EL.totalExpenseStat.textContent = `${Number(data.all_time.expense || 0).toLocaleString('vi-VN')} ₫`;
-            }
+        // Update balance
+        if (EL.balanceAmount) {
+            EL.balanceAmount.textContent = `${(data.balance || 0).toLocaleString('vi-VN')} ₫`;
+        }
+
+        // Update All-Time Stats in Sidebar
+        if (data.all_time) {
+            if (EL.totalIncomeStat) EL.totalIncomeStat.textContent = `${Number(data.all_time.income || 0).toLocaleString('vi-VN')} ₫`;
+            if (EL.totalExpenseStat) EL.totalExpenseStat.textContent = `${Number(data.all_time.expense || 0).toLocaleString('vi-VN')} ₫`;
+        }
 
-            // Update Stats in Sidebar (Selected Month)
-            if (Array.isArray(data.transactions)) {
-                updateSidebarStats(data.transactions, effectiveMonth);
+        // Update Stats in Sidebar (Selected Month)
+        if (Array.isArray(data.transactions)) {
+            updateSidebarStats(data.transactions, month);
 
-                // Process data for Chart
-                const chartData = {};
+            // Process data for Chart
+            const chartData = {};
+            data.transactions.forEach(t => {
+                const amount = Number(t.amount || 0);
+                if (chartData[t.category]) {
+                    chartData[t.category].amount += amount;
+                } else {
+                    chartData[t.category] = { amount: amount, type: t.type };
+                }
+            });
+            updateChart(chartData);
+
+            // Update Transaction List using DocumentFragment (js-batch-dom-updates)
+            if (EL.transactionList) {
+                const fragment = document.createDocumentFragment();
                 data.transactions.forEach(t => {
-                    const amount = Number(t.amount || 0);
-                    if (chartData[t.category]) {
-                        chartData[t.category].amount += amount;
-                    } else {
-                        chartData[t.category] = { amount: amount, type: t.type };
-                    }
-                });
-                updateChart(chartData);
-
-                // Update Transaction List using DocumentFragment (js-batch-dom-updates)
-                if (EL.transactionList) {
-                    const fragment = document.createDocumentFragment();
-                    data.transactions.forEach(t => {
-                        const li = document.createElement('li');
-                        li.className = `transaction-item ${t.type}`;
-                        li.innerHTML = `
-                            <div class="info">
-                                <span class="category">${t.category}</span>
-                                <span class="date">${t.date}</span>
+                    const li = document.createElement('li');
+                    li.className = `transaction-item ${t.type}`;
+                    li.innerHTML = `
+                        <div class="info">
+                            <span class="category">${t.category}</span>
+                            <span class="date">${t.date}</span>
+                        </div>
+                        <div class="right-section">
+                            <div class="amount">
+                                ${t.type === 'expense' ? '-' : '+'}${Number(t.amount || 0).toLocaleString('vi-VN')} ₫
                             </div>
-                            <div class="right-section">
-                                <div class="amount">
-                                    ${t.type === 'expense' ? '-' : '+'}${Number(t.amount || 0).toLocaleString('vi-VN')} ₫
-                                </div>
-                                <div class="actions">
-                                    <button class="edit-btn" onclick="editTransaction(${t.id}, ${t.amount}, '${t.category}', '${t.type}', '${t.description}', '${t.date}')">
-                                        <i class="fas fa-edit"></i> Edit
-                                    </button>
-                                    <button class="delete-btn" onclick="deleteTransaction(${t.id})">
-                                        <i class="fas fa-trash"></i> Delete
-                                    </button>
-                                </div>
+                            <div class="actions">
+                                <button class="edit-btn" onclick="editTransaction(${t.id}, ${t.amount}, '${t.category}', '${t.type}', '${t.description}', '${t.date}')">
+                                    <i class="fas fa-edit"></i> Edit
+                                </button>
+                                <button class="delete-btn" onclick="deleteTransaction(${t.id})">
+                                    <i class="fas fa-trash"></i> Delete
+                                </button>
                             </div>
-                        `;
-                        fragment.appendChild(li);
-                    });
-                    EL.transactionList.innerHTML = '';
-                    EL.transactionList.appendChild(fragment);
-                }
+                        </div>
+                    `;
+                    fragment.appendChild(li);
+                });
+                EL.transactionList.innerHTML = '';
+                EL.transactionList.appendChild(fragment);
             }
+        }
+    }
 
-            // Refresh budget status
-            if (typeof fetchBudgetStatus === 'function') {
-                await fetchBudgetStatus(effectiveMonth);
+    // Patch the current view from a data_updated delta; false when a full fetch is needed
+    function applyDelta(data) {
+        if (!data.delta || !dashboard || data.month !== dashboard.month) return false;
+
+        if (data.type === 'transaction') {
+            let transactions = dashboard.transactions;
+            if (data.transaction) {
+                transactions = transactions.filter(t => t.id !== data.transaction.id);
+                transactions.push(data.transaction);
+                transactions.sort((a, b) => String(b.date).localeCompare(String(a.date)));
+            } else if (data.removed_id != null) {
+                transactions = transactions.filter(t => t.id !== data.removed_id);
+            }
+            renderData({
+                balance: data.balance !== undefined ? data.balance : dashboard.balance,
+                all_time: data.all_time || dashboard.all_time,
+                transactions: transactions
+            }, dashboard.month);
+        }
+        if (data.budget_status) renderBudgetStatus(data.budget_status);
+        if (data.assets) renderAssets(data.assets);
+
+        // Add months that just got their first transaction
+        if (data.available_months && EL.monthSelector) {
+            const known = Array.from(EL.monthSelector.options, opt => opt.value);
+            if (data.available_months.some(m => !known.includes(m))) {
+                const selected = EL.monthSelector.value;
+                fillMonthSelector(data.available_months.slice());
+                EL.monthSelector.value = selected;
             }
-        } catch (error) {
-            console.error('Error in fetchData:', error);
         }
+        return true;
     }
 
     // Initial fetch to load data on page start
     // We will call this AFTER populating the month selector to ensure consistency
     // fetchData();
 
-    // Populate Month Selector and handle change
-    if (EL.monthSelector) {
-        async function updateAvailableMonths() {
-            try {
-                const response = await fetch('/api/available-months');
-                const months = await response.json();
-
-                // Always ensure current month is in the list
-                const currentMonth = new Date().toISOString().substring(0, 7);
-                if (!months.includes(currentMonth)) {
-                    months.unshift(currentMonth);
-                    // Sort again to maintain order
-                    months.sort().reverse();
-                }
+    function fillMonthSelector(months) {
+        // Always ensure current month is in the list
+        const currentMonth = new Date().toISOString().substring(0, 7);
+        if (!months.includes(currentMonth)) {
+            months.unshift(currentMonth);
+            // Sort again to maintain order
+            months.sort().reverse();
+        }
 
-                // Clear and repopulate
-                EL.monthSelector.innerHTML = '';
-                months.forEach(monthVal => {
-                    const [year, month] = monthVal.split('-');
-                    const date = new Date(year, month - 1, 1);
-                    const monthLabel = date.toLocaleDateString('vi-VN', { month: 'long', year: 'numeric' });
-
-                    const opt = document.createElement('option');
-                    opt.value = monthVal;
-                    opt.textContent = monthLabel;
-                    EL.monthSelector.appendChild(opt);
-                });
+        // Clear and repopulate
+        EL.monthSelector.innerHTML = '';
+        months.forEach(monthVal => {
+            const [year, month] = monthVal.split('-');
+            const date = new Date(year, month - 1, 1);
+            const monthLabel = date.toLocaleDateString('vi-VN', { month: 'long', year: 'numeric' });
+
+            const opt = document.createElement('option');
+            opt.value = monthVal;
+            opt.textContent = monthLabel;
+            EL.monthSelector.appendChild(opt);
+        });
+        return months;
+    }
 
-                // Set default value to saved month OR current month
-                const savedMonth = localStorage.getItem('selectedMonth');
-                if (savedMonth && months.includes(savedMonth)) {
-                    EL.monthSelector.value = savedMonth;
-                } else {
-                    EL.monthSelector.value = currentMonth;
-                    localStorage.setItem('selectedMonth', currentMonth);
-                }
+    // Populate Month Selector and handle change
+    if (EL.monthSelector) {
+        async function loadDashboard() {
+            // The saved month's data comes with the month list, so start with it
+            const currentMonth = new Date().toISOString().substring(0, 7);
+            const savedMonth = localStorage.getItem('selectedMonth') || currentMonth;
+            const data = await fetchData(savedMonth, { withAI: true });
+            if (!data) {
+                // Fallback initial fetch if the dashboard request fails
+                fetchData();
+                return;
+            }
 
-                // Initial fetch for the settled month
-                fetchData(EL.monthSelector.value);
+            const months = fillMonthSelector(data.available_months.slice());
 
-            } catch (e) {
-                console.error('Error fetching months:', e);
-                // Fallback initial fetch if selector fails
-                fetchData();
+            // Set default value to saved month OR current month
+            if (months.includes(savedMonth)) {
+                EL.monthSelector.value = savedMonth;
+            } else {
+                EL.monthSelector.value = currentMonth;
+                localStorage.setItem('selectedMonth', currentMonth);
+                fetchData(currentMonth);
             }
         }
 
-        updateAvailableMonths();
+        loadDashboard();
 
         EL.monthSelector.addEventListener('change', (e) => {
             const selectedMonth = e.target.value;
@@ -1021,7 +1080,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
-    // Initial fetch handled by updateAvailableMonths() or monthSelector logic
+    // Initial fetch handled by loadDashboard() or monthSelector logic
     // Removing redundant global call
 
 
@@ -1116,103 +1175,105 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             const url = month ? `/api/budget-status?month=${month}` : '/api/budget-status';
             const response = await fetch(url);
-            const budgets = await response.json();
+            renderBudgetStatus(await response.json());
+        } catch (error) {
+            console.error('Error fetching budget status:', error);
+        }
+    }
 
-            if (!EL.budgetList) return;
+    function renderBudgetStatus(budgets) {
+        if (!EL.budgetList) return;
 
-            if (budgets.length === 0) {
-                EL.budgetList.innerHTML = '<p style="text-align: center; opacity: 0.7;">No budgets set yet. Add one above!</p>';
-                return;
+        if (budgets.length === 0) {
+            EL.budgetList.innerHTML = '<p style="text-align: center; opacity: 0.7;">No budgets set yet. Add one above!</p>';
+            return;
+        }
+
+        const fragment = document.createDocumentFragment();
+        budgets.forEach(budget => {
+            const percentage = Math.min(budget.percentage, 100);
+
+            // Determine color based on level
+            let barColor, bgColor, statusText;
+            if (budget.level === 'danger') {
+                barColor = '#ef4444';
+                bgColor = 'rgba(239, 68, 68, 0.1)';
+                statusText = '⚠️ Over Budget!';
+            } else if (budget.level === 'warning') {
+                barColor = '#f59e0b';
+                bgColor = 'rgba(245, 158, 11, 0.1)';
+                statusText = '⚡ Close to limit';
+            } else {
+                barColor = '#10b981';
+                bgColor = 'rgba(16, 185, 129, 0.1)';
+                statusText = '✓ On track';
             }
 
-            const fragment = document.createDocumentFragment();
-            budgets.forEach(budget => {
-                const percentage = Math.min(budget.percentage, 100);
-
-                // Determine color based on level
-                let barColor, bgColor, statusText;
-                if (budget.level === 'danger') {
-                    barColor = '#ef4444';
-                    bgColor = 'rgba(239, 68, 68, 0.1)';
-                    statusText = '⚠️ Over Budget!';
-                } else if (budget.level === 'warning') {
-                    barColor = '#f59e0b';
-                    bgColor = 'rgba(245, 158, 11, 0.1)';
-                    statusText = '⚡ Close to limit';
-                } else {
-                    barColor = '#10b981';
-                    bgColor = 'rgba(16, 185, 129, 0.1)';
-                    statusText = '✓ On track';
-                }
+            const item = document.createElement('div');
+            item.className = 'budget-card';
+            item.style.cssText = `
+                background: rgba(255, 255, 255, 0.95);
+                padding: 1.25rem;
+                border-radius: 1rem;
+                border-left: 6px solid ${barColor};
+                box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1);
+                color: #1f2937;
+                position: relative;
+                overflow: hidden;
+            `;
 
-                const item = document.createElement('div');
-                item.className = 'budget-card';
-                item.style.cssText = `
-                    background: rgba(255, 255, 255, 0.95);
-                    padding: 1.25rem;
-                    border-radius: 1rem;
-                    border-left: 6px solid ${barColor};
-                    box-shadow: 0 10px 15px -3px rgba(0, 0, 0, 0.1);
-                    color: #1f2937;
-                    position: relative;
-                    overflow: hidden;
-                `;
-
-                item.innerHTML = `
-                    <div style="display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 1rem;">
-                        <div>
-                            <div style="font-size: 0.75rem; text-transform: uppercase; letter-spacing: 0.05em; font-weight: 700; color: #6b7280; margin-bottom: 0.25rem;">Category</div>
-                            <strong style="font-size: 1.25rem; color: #111827;">${budget.category}</strong>
-                        </div>
-                        <div style="text-align: right;">
-                            <span style="display: inline-block; padding: 0.25rem 0.75rem; border-radius: 2rem; font-size: 0.75rem; font-weight: 700; background: ${bgColor}; color: ${barColor}; border: 1px solid ${barColor}44;">
-                                ${statusText}
-                            </span>
-                        </div>
+            item.innerHTML = `
+                <div style="display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 1rem;">
+                    <div>
+                        <div style="font-size: 0.75rem; text-transform: uppercase; letter-spacing: 0.05em; font-weight: 700; color: #6b7280; margin-bottom: 0.25rem;">Category</div>
+                        <strong style="font-size: 1.25rem; color: #111827;">${budget.category}</strong>
                     </div>
-                    
-                    <div style="background: #f3f4f6; height: 1rem; border-radius: 0.5rem; overflow: hidden; margin-bottom: 1rem; position: relative;">
-                        <div style="background: ${barColor}; height: 100%; width: ${percentage}%; transition: width 0.8s cubic-bezier(0.4, 0, 0.2, 1); border-radius: 0.5rem;"></div>
+                    <div style="text-align: right;">
+                        <span style="display: inline-block; padding: 0.25rem 0.75rem; border-radius: 2rem; font-size: 0.75rem; font-weight: 700; background: ${bgColor}; color: ${barColor}; border: 1px solid ${barColor}44;">
+                            ${statusText}
+                        </span>
                     </div>
-                    
-                    <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 1rem;">
-                        <div style="background: #f9fafb; padding: 0.75rem; border-radius: 0.5rem;">
-                            <div style="font-size: 0.7rem; color: #6b7280; font-weight: 600; text-transform: uppercase;">Spent</div>
-                            <div style="font-size: 1rem; font-weight: 700;">${formatVND(budget.spent)} ₫</div>
-                        </div>
-                        <div style="background: #f9fafb; padding: 0.75rem; border-radius: 0.5rem;">
-                            <div style="font-size: 0.7rem; color: #6b7280; font-weight: 600; text-transform: uppercase;">Limit</div>
-                            <div style="font-size: 1rem; font-weight: 700;">${formatVND(budget.limit)} ₫</div>
-                        </div>
+                </div>
+                
+                <div style="background: #f3f4f6; height: 1rem; border-radius: 0.5rem; overflow: hidden; margin-bottom: 1rem; position: relative;">
+                    <div style="background: ${barColor}; height: 100%; width: ${percentage}%; transition: width 0.8s cubic-bezier(0.4, 0, 0.2, 1); border-radius: 0.5rem;"></div>
+                </div>
+                
+                <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 1rem;">
+                    <div style="background: #f9fafb; padding: 0.75rem; border-radius: 0.5rem;">
+                        <div style="font-size: 0.7rem; color: #6b7280; font-weight: 600; text-transform: uppercase;">Spent</div>
+                        <div style="font-size: 1rem; font-weight: 700;">${formatVND(budget.spent)} ₫</div>
                     </div>
-                    
-                    <div style="margin-top: 1rem; display: flex; justify-content: space-between; align-items: center;">
-                        <div style="font-size: 0.875rem; font-weight: 600;">
-                            ${budget.remaining >= 0 ?
-                        `Remaining: <span style="color: #10b981;">${formatVND(budget.remaining)} ₫</span>` :
-                        `Over by: <span style="color: #ef4444;">${formatVND(Math.abs(budget.remaining))} ₫</span>`}
-                        </div>
-                        <div style="display: flex; gap: 0.5rem;">
-                            <button onclick="editBudget('${budget.category}', ${budget.limit})" style="background: #10b981; border: none; color: white; font-size: 0.75rem; font-weight: 700; cursor: pointer; padding: 0.4rem 0.8rem; border-radius: 0.5rem; transition: all 0.2s;">
-                                Edit
-                            </button>
-                            <button onclick="deleteBudget('${budget.category}')" style="background: none; border: none; color: #ef4444; font-size: 0.75rem; font-weight: 700; cursor: pointer; text-decoration: underline; padding: 0.5rem;">
-                                Remove
-                            </button>
-                        </div>
+                    <div style="background: #f9fafb; padding: 0.75rem; border-radius: 0.5rem;">
+                        <div style="font-size: 0.7rem; color: #6b7280; font-weight: 600; text-transform: uppercase;">Limit</div>
+                        <div style="font-size: 1rem; font-weight: 700;">${formatVND(budget.limit)} ₫</div>
                     </div>
-                    
-                    <div style="position: absolute; right: -10px; top: -10px; font-size: 4rem; opacity: 0.05; pointer-events: none; transform: rotate(15deg);">
-                        ${budget.category.split(' ')[0]}
+                </div>
+                
+                <div style="margin-top: 1rem; display: flex; justify-content: space-between; align-items: center;">
+                    <div style="font-size: 0.875rem; font-weight: 600;">
+                        ${budget.remaining >= 0 ?
+                    `Remaining: <span style="color: #10b981;">${formatVND(budget.remaining)} ₫</span>` :
+                    `Over by: <span style="color: #ef4444;">${formatVND(Math.abs(budget.remaining))} ₫</span>`}
                     </div>
-                `;
-                fragment.appendChild(item);
-            });
-            EL.budgetList.innerHTML = '';
-            EL.budgetList.appendChild(fragment);
-        } catch (error) {
-            console.error('Error fetching budget status:', error);
-        }
+                    <div style="display: flex; gap: 0.5rem;">
+                        <button onclick="editBudget('${budget.category}', ${budget.limit})" style="background: #10b981; border: none; color: white; font-size: 0.75rem; font-weight: 700; cursor: pointer; padding: 0.4rem 0.8rem; border-radius: 0.5rem; transition: all 0.2s;">
+                            Edit
+                        </button>
+                        <button onclick="deleteBudget('${budget.category}')" style="background: none; border: none; color: #ef4444; font-size: 0.75rem; font-weight: 700; cursor: pointer; text-decoration: underline; padding: 0.5rem;">
+                            Remove
+                        </button>
+                    </div>
+                </div>
+                
+                <div style="position: absolute; right: -10px; top: -10px; font-size: 4rem; opacity: 0.05; pointer-events: none; transform: rotate(15deg);">
+                    ${budget.category.split(' ')[0]}
+                </div>
+            `;
+            fragment.appendChild(item);
+        });
+        EL.budgetList.innerHTML = '';
+        EL.budgetList.appendChild(fragment);
     }
 
     // Edit Budget
@@ -1249,9 +1310,6 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
-    // Fetch budget status on load
-    fetchBudgetStatus();
-
     // ========== ASSETS & SAVINGS LOGIC ==========
     const assetColors = {
         'Cash': 'bg-gradient-to-r from-green-400 to-green-500', // emerald
@@ -1278,120 +1336,123 @@ document.addEventListener('DOMContentLoaded', () => {
         try {
             const url = month ? `/api/assets?month=${month}` : '/api/assets';
             const response = await fetch(url);
-            const assets = await response.json();
-
-            EL.assetsLoading.style.display = 'none';
-            EL.assetsContent.style.display = 'block';
-
-            const liquidContainer = document.getElementById('liquid-assets-list');
-            const savingsContainer = document.getElementById('savings-assets-list');
-
-            if (liquidContainer) liquidContainer.innerHTML = '';
-            if (savingsContainer) savingsContainer.innerHTML = '';
-
-            // Separate Assets
-            const liquidTypes = ['Cash', 'Bank', 'Other'];
-            // Everything else goes to Savings/Investments unless explicitly specified?
-            // Let's stick to the user's implicit logic: Cash/Bank/Other -> Liquid.
-            // Savings/Cumulative/Stock/Crypto/RealEstate/Gold -> Savings.
-
-            assets.forEach(a => {
-                const isLiquid = liquidTypes.includes(a.type);
-                const container = isLiquid ? liquidContainer : savingsContainer;
-                if (!container) return;
-
-                const card = document.createElement('div');
-                card.className = 'asset-card';
-
-                // Calculate Savings Info if applicable
-                let footerInfo = '';
-                let progressBar = '';
-                let extraValue = '';
-
-                if (!isLiquid) {
-                    // Savings Logic
-                    let matureDateObj = null;
-                    let startDateObj = a.start_date ? new Date(a.start_date) : new Date();
-                    const now = new Date();
-
-                    if (a.end_date) {
-                        matureDateObj = new Date(a.end_date);
-                    } else if (a.term_months) {
-                        matureDateObj = new Date(startDateObj);
-                        matureDateObj.setMonth(matureDateObj.getMonth() + a.term_months);
-                    }
-
-                    // Interest Calc
-                    let expectedInterest = 0;
-                    if (a.term_months && a.interest_rate) {
-                        expectedInterest = a.amount * (a.interest_rate / 100) * (a.term_months / 12);
-                    } else if (a.type === 'Cumulative' && matureDateObj) {
-                        // Cumulative approx
-                        const diffTime = Math.abs(matureDateObj - startDateObj);
-                        const diffDays = Math.ceil(diffTime / (1000 * 60 * 60 * 24));
-                        const months = Math.floor(diffDays / 30);
-                        const totalPrincipal = a.amount + (a.auto_contribution || 0) * months;
-                        const avgBalance = (a.amount + totalPrincipal) / 2;
-                        const years = diffDays / 365.0;
-                        expectedInterest = avgBalance * (a.interest_rate / 100) * years;
-                    } else if (matureDateObj) {
-                        // Simple annual
-                        const diffTime = Math.abs(matureDateObj - startDateObj);
-                        const diffDays = Math.ceil(diffTime / (1000 * 60 * 60 * 24));
-                        const years = diffDays / 365.0;
-                        expectedInterest = a.amount * (a.interest_rate / 100) * years;
-                    }
+            renderAssets(await response.json());
+        } catch (e) {
+            console.error('Error fetching assets:', e);
+            if (EL.assetsLoading) EL.assetsLoading.textContent = 'Failed to load assets.';
+        }
+    }
 
-                    if (matureDateObj) {
-                        const totalDuration = matureDateObj.getTime() - startDateObj.getTime();
-                        const elapsed = now.getTime() - startDateObj.getTime();
-                        const progress = Math.min(100, Math.max(0, (elapsed / totalDuration) * 100));
+    function renderAssets(assets) {
+        if (!EL.assetsLoading || !EL.assetsContent) return;
 
-                        progressBar = `
-                            <div style="position: absolute; bottom: 0; left: 0; h-1; width: 100%; background: rgba(255,255,255,0.1);">
-                                <div style="height: 3px; background: #34d399; width: ${progress}%;"></div>
-                            </div>
-                        `;
-                        footerInfo = `<div style="font-size: 0.75rem; opacity: 0.7; margin-top: 0.5rem;">Ends: ${matureDateObj.toLocaleDateString('vi-VN')}</div>`;
-                    }
+        EL.assetsLoading.style.display = 'none';
+        EL.assetsContent.style.display = 'block';
+
+        const liquidContainer = document.getElementById('liquid-assets-list');
+        const savingsContainer = document.getElementById('savings-assets-list');
+
+        if (liquidContainer) liquidContainer.innerHTML = '';
+        if (savingsContainer) savingsContainer.innerHTML = '';
+
+        // Separate Assets
+        const liquidTypes = ['Cash', 'Bank', 'Other'];
+        // Everything else goes to Savings/Investments unless explicitly specified?
+        // Let's stick to the user's implicit logic: Cash/Bank/Other -> Liquid.
+        // Savings/Cumulative/Stock/Crypto/RealEstate/Gold -> Savings.
+
+        assets.forEach(a => {
+            const isLiquid = liquidTypes.includes(a.type);
+            const container = isLiquid ? liquidContainer : savingsContainer;
+            if (!container) return;
+
+            const card = document.createElement('div');
+            card.className = 'asset-card';
+
+            // Calculate Savings Info if applicable
+            let footerInfo = '';
+            let progressBar = '';
+            let extraValue = '';
+
+            if (!isLiquid) {
+                // Savings Logic
+                let matureDateObj = null;
+                let startDateObj = a.start_date ? new Date(a.start_date) : new Date();
+                const now = new Date();
+
+                if (a.end_date) {
+                    matureDateObj = new Date(a.end_date);
+                } else if (a.term_months) {
+                    matureDateObj = new Date(startDateObj);
+                    matureDateObj.setMonth(matureDateObj.getMonth() + a.term_months);
+                }
 
-                    if (expectedInterest > 0) {
-                        extraValue = `<div style="font-size: 0.8rem; color: #6ee7b7; font-weight: 600;">+${formatVND(expectedInterest.toFixed(0))}</div>`;
-                    }
+                // Interest Calc
+                let expectedInterest = 0;
+                if (a.term_months && a.interest_rate) {
+                    expectedInterest = a.amount * (a.interest_rate / 100) * (a.term_months / 12);
+                } else if (a.type === 'Cumulative' && matureDateObj) {
+                    // Cumulative approx
+                    const diffTime = Math.abs(matureDateObj - startDateObj);
+                    const diffDays = Math.ceil(diffTime / (1000 * 60 * 60 * 24));
+                    const months = Math.floor(diffDays / 30);
+                    const totalPrincipal = a.amount + (a.auto_contribution || 0) * months;
+                    const avgBalance = (a.amount + totalPrincipal) / 2;
+                    const years = diffDays / 365.0;
+                    expectedInterest = avgBalance * (a.interest_rate / 100) * years;
+                } else if (matureDateObj) {
+                    // Simple annual
+                    const diffTime = Math.abs(matureDateObj - startDateObj);
+                    const diffDays = Math.ceil(diffTime / (1000 * 60 * 60 * 24));
+                    const years = diffDays / 365.0;
+                    expectedInterest = a.amount * (a.interest_rate / 100) * years;
                 }
 
-                card.innerHTML = `
-                    <div class="asset-actions">
-                        <button class="asset-action-btn" onclick='editAsset(${JSON.stringify(a).replace(/'/g, "&#39;")})' title="Edit">
-                            <i class="fas fa-pen"></i>
-                        </button>
-                    </div>
-                    <div class="asset-type">${getAssetIcon(a.type)} ${a.type}</div>
-                    <div class="asset-name">${a.name}</div>
-                    <div class="asset-amount">${formatVND(a.amount)} ₫</div>
-                    ${extraValue}
-                    ${footerInfo}
-                    ${progressBar}
-                `;
-                container.appendChild(card);
-            });
+                if (matureDateObj) {
+                    const totalDuration = matureDateObj.getTime() - startDateObj.getTime();
+                    const elapsed = now.getTime() - startDateObj.getTime();
+                    const progress = Math.min(100, Math.max(0, (elapsed / totalDuration) * 100));
 
-            // Populate Payment Source Dropdown (Liquid only)
-            if (EL.assetSelect) {
-                // Keep "None"
-                while (EL.assetSelect.options.length > 1) EL.assetSelect.remove(1);
+                    progressBar = `
+                        <div style="position: absolute; bottom: 0; left: 0; h-1; width: 100%; background: rgba(255,255,255,0.1);">
+                            <div style="height: 3px; background: #34d399; width: ${progress}%;"></div>
+                        </div>
+                    `;
+                    footerInfo = `<div style="font-size: 0.75rem; opacity: 0.7; margin-top: 0.5rem;">Ends: ${matureDateObj.toLocaleDateString('vi-VN')}</div>`;
+                }
 
-                assets.filter(a => liquidTypes.includes(a.type)).forEach(a => {
-                    const opt = document.createElement('option');
-                    opt.value = a.id;
-                    opt.textContent = `${a.name} (${formatVND(a.amount)})`;
-                    EL.assetSelect.appendChild(opt);
-                });
+                if (expectedInterest > 0) {
+                    extraValue = `<div style="font-size: 0.8rem; color: #6ee7b7; font-weight: 600;">+${formatVND(expectedInterest.toFixed(0))}</div>`;
+                }
             }
 
-        } catch (e) {
-            console.error('Error fetching assets:', e);
-            if (EL.assetsLoading) EL.assetsLoading.textContent = 'Failed to load assets.';
+            card.innerHTML = `
+                <div class="asset-actions">
+                    <button class="asset-action-btn" onclick='editAsset(${JSON.stringify(a).replace(/'/g, "&#39;")})' title="Edit">
+                        <i class="fas fa-pen"></i>
+                    </button>
+                </div>
+                <div class="asset-type">${getAssetIcon(a.type)} ${a.type}</div>
+                <div class="asset-name">${a.name}</div>
+                <div class="asset-amount">${formatVND(a.amount)} ₫</div>
+                ${extraValue}
+                ${footerInfo}
+                ${progressBar}
+            `;
+            container.appendChild(card);
+        });
+
+        // Populate Payment Source Dropdown (Liquid only)
+        if (EL.assetSelect) {
+            // Keep "None"
+            while (EL.assetSelect.options.length > 1) EL.assetSelect.remove(1);
+
+            assets.filter(a => liquidTypes.includes(a.type)).forEach(a => {
+                const opt = document.createElement('option');
+                opt.value = a.id;
+                opt.textContent = `${a.name} (${formatVND(a.amount)})`;
+                EL.assetSelect.appendChild(opt);
+            });
         }
     }
 
@@ -1500,12 +1561,6 @@ document.addEventListener('DOMContentLoaded', () => {
     if (assetAmount) setupSmartInput(assetAmount);
     if (assetAuto) setupSmartInput(assetAuto);
 
-    // Initial Fetch (Assets) logic is called inside fetchData usually, or separately?
-    // Let's check fetchData.
-    // fetchData is called on load? No, line 1673 ends the block.
-    // We need to make sure fetchAssets is called on load.
-    fetchAssets();
-
     // --- Bulk AI Import Logic ---
 
     window.openBulkModal = () => {
@@ -1537,20 +1592,55 @@ document.addEventListener('DOMContentLoaded', () => {
         EL.bulkLoading.style.display = 'block';
 
         try {
-            const response = await fetch('/api/ai/bulk-extract', {
+            // Server-sent events: each row shows up as soon as the model has written it
+            const response = await fetch('/api/ai/bulk-extract/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ text })
             });
-            const data = await response.json();
+            if (!response.ok || !response.body) {
+                const data = await response.json();
+                alert(data.error || "Could not extract transactions.");
+                backToBulkInput();
+                return;
+            }
 
-            if (data.transactions) {
-                EL.detectedTransactions = data.transactions;
+            EL.detectedTransactions = [];
+            const errors = [];
+            let shown = false;
+            const showReview = () => {
+                if (shown) return;
+                shown = true;
                 renderBulkReview();
                 EL.bulkLoading.style.display = 'none';
                 EL.bulkReviewStep.style.display = 'block';
+            };
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const messages = buffer.split('\n\n');
+                buffer = messages.pop();
+                for (const message of messages) {
+                    const { event, data } = parseSSE(message);
+                    if (!data) continue;
+                    if (data.error) errors.push(data.error);
+                    if (event === 'transaction') {
+                        showReview();
+                        appendBulkRows([data.transaction]);
+                    }
+                }
+            }
+
+            if (EL.detectedTransactions.length > 0 || errors.length === 0) {
+                showReview();
+                if (errors.length > 0) console.warn('Some chunks failed:', errors);
             } else {
-                alert(data.error || "Could not extract transactions.");
+                alert(errors[0] || "Could not extract transactions.");
                 backToBulkInput();
             }
         } catch (error) {
@@ -1560,47 +1650,70 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    const BULK_CATEGORIES = ["Food", "Rent", "Utilities", "Transport", "Groceries", "Shopping", "Entertainment", "Travel", "Health", "Salary", "Bonus", "Investment", "Other Income", "Other"];
+
+    // One "event: x\ndata: {...}" block of a text/event-stream body
+    function parseSSE(message) {
+        let event = 'message';
+        const dataLines = [];
+        message.split('\n').forEach(line => {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+        });
+        return { event, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+    }
+
     function renderBulkReview() {
         if (!EL.bulkTableBody) return;
         EL.bulkTableBody.innerHTML = '';
         if (EL.detectedTransactions.length === 0) {
-            EL.bulkTableBody.innerHTML = '<tr><td colspan="5" style="text-align:center; padding: 2rem; color: #94a3b8;">No transactions found in this text.</td></tr>';
+            EL.bulkTableBody.innerHTML = '<tr class="bulk-empty-row"><td colspan="5" style="text-align:center; padding: 2rem; color: #94a3b8;">No transactions found in this text.</td></tr>';
             return;
         }
+        EL.detectedTransactions.forEach((t, index) => renderBulkRow(t, index));
+        updateBulkCount();
+    }
 
-        const standardCats = ["Food", "Rent", "Utilities", "Transport", "Groceries", "Shopping", "Entertainment", "Travel", "Health", "Salary", "Bonus", "Investment", "Other Income", "Other"];
-
-        EL.detectedTransactions.forEach((t, index) => {
-            const row = document.createElement('tr');
-            row.style.borderBottom = '1px solid #f1f5f9';
-
-            // Normalize category if AI hallucinated
-            const cat = standardCats.includes(t.category) ? t.category : "Other";
-
-            row.innerHTML = `
-                <td style="padding: 0.75rem;"><input type="checkbox" class="bulk-item-check" data-index="${index}" checked></td>
-                <td style="padding: 0.5rem;"><input type="date" class="bulk-edit-date" data-index="${index}" value="${t.date}" style="border:1px solid #e2e8f0; padding:0.2rem; border-radius:0.3rem; font-size:0.8rem;"></td>
-                <td style="padding: 0.5rem;">
-                    <input type="text" class="bulk-edit-desc" data-index="${index}" value="${t.description}" style="width:100%; border:1px solid #e2e8f0; padding:0.2rem; border-radius:0.3rem; font-size:0.8rem;">
-                    <div style="font-size:0.7rem; color:#94a3b8; margin-top:0.2rem; font-style:italic;">Source: "${t.original_snippet || 'N/A'}"</div>
-                </td>
-                <td style="padding: 0.5rem;">
-                    <select class="bulk-edit-cat" data-index="${index}" style="border:1px solid #e2e8f0; padding:0.2rem; border-radius:0.3rem; font-size:0.8rem;">
-                        ${standardCats.map(c => `<option value="${c}" ${cat === c ? 'selected' : ''}>${c}</option>`).join('')}
-                    </select>
-                </td>
-                <td style="padding: 0.5rem; text-align: right;">
-                    <div style="display:flex; align-items:center; justify-content:flex-end; gap:0.2rem;">
-                        <span style="font-weight:700; color: ${t.type === 'expense' ? '#ef4444' : '#10b981'};">${t.type === 'expense' ? '-' : '+'}</span>
-                        <input type="number" class="bulk-edit-amount" data-index="${index}" value="${t.amount}" style="width:80px; border:1px solid #e2e8f0; padding:0.2rem; border-radius:0.3rem; font-size:0.8rem; text-align:right;">
-                    </div>
-                </td>
-            `;
-            EL.bulkTableBody.appendChild(row);
+    // Add rows without touching the ones the user may already be editing
+    function appendBulkRows(transactions) {
+        if (!EL.bulkTableBody) return;
+        EL.bulkTableBody.querySelector('.bulk-empty-row')?.remove();
+        transactions.forEach(t => {
+            EL.detectedTransactions.push(t);
+            renderBulkRow(t, EL.detectedTransactions.length - 1);
         });
         updateBulkCount();
     }
 
+    function renderBulkRow(t, index) {
+        const row = document.createElement('tr');
+        row.style.borderBottom = '1px solid #f1f5f9';
+
+        // Normalize category if AI hallucinated
+        const cat = BULK_CATEGORIES.includes(t.category) ? t.category : "Other";
+
+        row.innerHTML = `
+            <td style="padding: 0.75rem;"><input type="checkbox" class="bulk-item-check" data-index="${index}" checked></td>
+            <td style="padding: 0.5rem;"><input type="date" class="bulk-edit-date" data-index="${index}" value="${t.date}" style="border:1px solid #e2e8f0; padding:0.2rem; border-radius:0.3rem; font-size:0.8rem;"></td>
+            <td style="padding: 0.5rem;">
+                <input type="text" class="bulk-edit-desc" data-index="${index}" value="${t.description}" style="width:100%; border:1px solid #e2e8f0; padding:0.2rem; border-radius:0.3rem; font-size:0.8rem;">
+                <div style="font-size:0.7rem; color:#94a3b8; margin-top:0.2rem; font-style:italic;">Source: "${t.original_snippet || 'N/A'}"</div>
+            </td>
+            <td style="padding: 0.5rem;">
+                <select class="bulk-edit-cat" data-index="${index}" style="border:1px solid #e2e8f0; padding:0.2rem; border-radius:0.3rem; font-size:0.8rem;">
+                    ${BULK_CATEGORIES.map(c => `<option value="${c}" ${cat === c ? 'selected' : ''}>${c}</option>`).join('')}
+                </select>
+            </td>
+            <td style="padding: 0.5rem; text-align: right;">
+                <div style="display:flex; align-items:center; justify-content:flex-end; gap:0.2rem;">
+                    <span style="font-weight:700; color: ${t.type === 'expense' ? '#ef4444' : '#10b981'};">${t.type === 'expense' ? '-' : '+'}</span>
+                    <input type="number" class="bulk-edit-amount" data-index="${index}" value="${t.amount}" style="width:80px; border:1px solid #e2e8f0; padding:0.2rem; border-radius:0.3rem; font-size:0.8rem; text-align:right;">
+                </div>
+            </td>
+        `;
+        EL.bulkTableBody.appendChild(row);
+    }
+
     function updateBulkCount() {
         const checked = document.querySelectorAll('.bulk-item-check:checked').length;
         if (EL.bulkCountBadge) EL.bulkCountBadge.textContent = checked;
@@ -1638,14 +1751,16 @@ document.addEventListener('DOMContentLoaded', () => {
         });
 
         try {
-            let successCount = 0;
-            for (const t of toSave) {
-                const res = await fetch('/add', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(t)
-                });
-                if (res.ok) successCount++;
+            // One request / one commit for the whole import
+            const res = await fetch('/api/transactions/bulk', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ transactions: toSave })
+            });
+            const result = await res.json();
+            const successCount = result.inserted || 0;
+            if (result.errors && result.errors.length > 0) {
+                console.warn('Skipped transactions:', result.errors);
             }
             alert(`Successfully imported ${successCount} transactions!`);
             closeBulkModal();